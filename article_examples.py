@@ -1,4 +1,5 @@
 from pomonoid import *
+import hasse
 
 """
 Models of partially ordered monoids appearing in `The radical-annihilator
@@ -110,31 +111,10 @@ ZDLRc.attach_order(ordering={
 ZDLRbf = ProductPomonoid(ZDLRb, field)
 ZDLRcf = ProductPomonoid(ZDLRc, field)
 ZDLRbc = ProductPomonoid(ZDLRb, ZDLRc)
-# The minify() method only removes the simplest redundant paths
-# The following corrections are manually removing 2-and 3-step redundancies
-ZDLRbc.order.incidence[ZDLRbc.lookup['aar']][ZDLRbc.lookup['1']] = False
-ZDLRbc.order.incidence[ZDLRbc.lookup['ra']][ZDLRbc.lookup['ara']] = False
-ZDLRbc.order.incidence[ZDLRbc.lookup['r']][ZDLRbc.lookup['ar']] = False
-#ZDLRbc.order.incidence[ZDLRbc.lookup['aarar']][ZDLRbc.lookup['ar']] = False
-#ZDLRbc.order.incidence[ZDLRbc.lookup['aarar']][ZDLRbc.lookup['ara']] = False
-
-# test4 = ProductPomonoid(ZDLRbc.export(), semiprime)
+test4 = ProductPomonoid(ZDLRbc.export(), semiprime)
 largest_zdr = ProductPomonoid(ZDLRbc.export(), field)
-# largest_zdr.order.incidence[largest_zdr.lookup['aarar']][largest_zdr.lookup['ar']] = False
-# largest_zdr.order.incidence[largest_zdr.lookup['aarara']][largest_zdr.lookup['ara']] = False
-
-
-# semiprime.draw('semiprime')
-# dual.draw('dual')
-largest_dual.draw('largest_dual')
-largest_zdr.draw('largest_zdr')
-#
-ZDLRb.draw('ZDRLb')
-ZDLRc.draw('ZDRLc')
-ZDLRbf.draw('ZDLRbf')
-ZDLRcf.draw('ZDLRcf')
-ZDLRbc.draw('ZDLRbc')
-# test4.draw('test4')
+
+
 trial=Pomonoid(relations={
 						  ('ararar', 'rar'),
 						  ('ararara', 'rara'),
@@ -142,7 +122,8 @@ trial=Pomonoid(relations={
 						  ('aarar', 'rar'),
 						  ('aarara', 'rara'),
 						  ('aararaa', 'raraa'),
-                          })
+                          },
+               max_length=9)
 # if a(I)!=0, I is contained in a minimal prime
 # then rI is in the lattice I studied.
 # if rI is contained in (x,y), then rarI=aN
@@ -151,6 +132,19 @@ trial=Pomonoid(relations={
 # consequently, the following are equal to rar:
 # aarar, ararar, and any
 
-
-# need to get relations working for exported monoids to do the following
-# test4 = ProductPomonoid(semiprime, ZDLRbc.export())
+# exported monoids evaluate words on their tables, so they can be factors
+# on either side
+test4b = ProductPomonoid(semiprime, ZDLRbc.export())
+
+
+if __name__ == '__main__':
+    # semiprime.draw('semiprime')
+    # dual.draw('dual')
+    hasse.draw_all({'largest_dual': largest_dual,
+                    'largest_zdr': largest_zdr,
+                    'ZDRLb': ZDLRb,
+                    'ZDRLc': ZDLRc,
+                    'ZDLRbf': ZDLRbf,
+                    'ZDLRcf': ZDLRcf,
+                    'ZDLRbc': ZDLRbc,
+                    'test4': test4})
@@ -0,0 +1,255 @@
+"""
+Check that a Pomonoid is really a partially ordered monoid: its table is
+associative with '1' as identity, its order is a partial order, and
+multiplication on either side preserves the order.
+
+The checks run over the integer Cayley table. With NumPy they are done in
+batches with fancy indexing, otherwise row by row on tuples and bitsets.
+Each violated axiom is reported once, with its least counterexample in the
+numbering of the table (shortlex order for enumerated monoids).
+"""
+import importlib.util
+from collections import namedtuple
+
+import bitsets
+from cayley import CayleyTable, gather
+
+Violation = namedtuple('Violation', 'axiom elements message')
+
+# Number of order pairs checked at once for monotonicity with NumPy
+CHUNK = 4096
+
+# Messages take the product function and the counterexample elements
+MESSAGES = {
+    'associativity':
+        lambda p, x, y, z: "(%s%s)%s = %s but %s(%s%s) = %s"
+                           % (x, y, z, p(p(x, y), z), x, y, z, p(x, p(y, z))),
+    'identity':
+        lambda p, x: "1%s = %s and %s1 = %s" % (x, p('1', x), x, p(x, '1')),
+    'reflexivity':
+        lambda p, x: "%s is missing from the order" % x,
+    'antisymmetry':
+        lambda p, x, y: "%s <= %s and %s <= %s" % (x, y, y, x),
+    'transitivity':
+        lambda p, x, y, z: "%s <= %s and %s <= %s but not %s <= %s"
+                           % (x, y, y, z, x, z),
+    'left monotonicity':
+        lambda p, x, y, z: "%s <= %s but %s%s = %s is not <= %s%s = %s"
+                           % (x, y, z, x, p(z, x), z, y, p(z, y)),
+    'right monotonicity':
+        lambda p, x, y, z: "%s <= %s but %s%s = %s is not <= %s%s = %s"
+                           % (x, y, x, z, p(x, z), y, z, p(y, z)),
+}
+
+
+def _table(monoid):
+    table = monoid.operation.cayley_table
+    if table is None:
+        table = CayleyTable.from_dict(monoid.operation.table)
+    return table
+
+
+def _order_rows(order, words):
+    """
+    :return: (bitsets of the strict order in the numbering of words,
+              ids of the words missing from the order); the up-sets of an
+              order with a cycle contain the elements on it, which are
+              left out so that only distinct elements are reported
+    """
+    if not hasattr(order, 'up'):
+        return [sum(1 << j for j, f in enumerate(words)
+                    if e != f and order.compare(e, f))
+                for e in words], []
+    ids = dict((e, i) for i, e in enumerate(words))
+    missing = [i for i, e in enumerate(words) if e not in order._index]
+    rows = [0] * len(words)
+    for e, i in ids.items():
+        if e not in order._index:
+            continue
+        row = order.up[order._index[e]]
+        for j in bitsets.bits(row):
+            f = order._elements[j]
+            if f in ids:
+                rows[i] |= 1 << ids[f]
+        rows[i] &= ~(1 << i)
+    return rows, missing
+
+
+def verify(monoid, use_numpy=None):
+    """
+    :param monoid: Pomonoid or ProductPomonoid with a complete table
+    :param use_numpy: force (True) or avoid (False) NumPy; by default it is
+        used when it can be imported
+    :return: list of Violation tuples, empty when every axiom holds
+    """
+    if use_numpy is None:
+        use_numpy = importlib.util.find_spec('numpy') is not None
+
+    table = _table(monoid)
+    words = table.words
+    # elements of implicit products are tuples, named by their words
+    name = getattr(monoid, 'word', str)
+    identity = None
+    for i, e in enumerate(words):
+        if name(e) == '1':
+            identity = i
+    found = []
+    if identity is None:
+        found.append(('identity', ()))
+    rows = None
+    order = getattr(monoid, 'order', None)
+    if order is not None:
+        rows, missing = _order_rows(order, words)
+        if missing:
+            found.append(('reflexivity', (missing[0],)))
+
+    if use_numpy:
+        found += _verify_numpy(table, identity, rows)
+    else:
+        found += _verify_python(table, identity, rows)
+
+    def prod(x, y):
+        return name(table.words[table.prod_id(names[x], names[y])])
+
+    names = dict((name(e), i) for i, e in enumerate(words))
+    result = []
+    for axiom, ids in found:
+        elements = tuple(words[i] for i in ids)
+        if ids:
+            message = MESSAGES[axiom](prod, *[name(e) for e in elements])
+        else:
+            message = "there is no element '1'"
+        result.append(Violation(axiom, elements, message))
+    return result
+
+
+def _verify_python(table, identity, rows):
+    n = table.size
+    columns = [tuple(table.column(j)) for j in range(n)]
+    # T[x] lists x*y for every y
+    T = [tuple(column[i] for column in columns) for i in range(n)]
+    found = []
+
+    for x in range(n):
+        Tx = T[x]
+        for y in range(n):
+            lhs = T[Tx[y]]
+            rhs = gather(Tx, T[y])
+            if lhs != rhs:
+                z = next(z for z in range(n) if lhs[z] != rhs[z])
+                found.append(('associativity', (x, y, z)))
+                break
+        if found:
+            break
+
+    if identity is not None:
+        for x in range(n):
+            if T[identity][x] != x or T[x][identity] != x:
+                found.append(('identity', (x,)))
+                break
+
+    if rows is None:
+        return found
+    leq = [row | 1 << i for i, row in enumerate(rows)]
+
+    for x in range(n):
+        back = [y for y in bitsets.bits(rows[x]) if rows[y] >> x & 1]
+        if back:
+            found.append(('antisymmetry', (x, back[0])))
+            break
+
+    def transitivity():
+        for x in range(n):
+            for y in bitsets.bits(rows[x]):
+                missing = rows[y] & ~leq[x]
+                if missing:
+                    return (x, y, next(bitsets.bits(missing)))
+
+    def monotonicity(lines):
+        for x in range(n):
+            for y in bitsets.bits(rows[x]):
+                lx, ly = lines[x], lines[y]
+                for z in range(n):
+                    if not leq[lx[z]] >> ly[z] & 1:
+                        return (x, y, z)
+
+    for axiom, witness in (('transitivity', transitivity()),
+                           ('left monotonicity', monotonicity(columns)),
+                           ('right monotonicity', monotonicity(T))):
+        if witness is not None:
+            found.append((axiom, witness))
+    return found
+
+
+def _verify_numpy(table, identity, rows):
+    import numpy as np
+
+    n = table.size
+    if table.backend == 'numpy':
+        T = np.asarray(table.data, dtype=np.intp)
+    else:
+        T = np.array(table.data, dtype=np.intp).reshape(n, n).T
+    found = []
+
+    for x in range(n):
+        # [y, z] entries of (xy)z and x(yz)
+        bad = T[T[x]] != T[x][T]
+        if bad.any():
+            y, z = np.unravel_index(np.argmax(bad), bad.shape)
+            found.append(('associativity', (x, int(y), int(z))))
+            break
+
+    if identity is not None:
+        ids = np.arange(n)
+        bad = (T[identity] != ids) | (T[:, identity] != ids)
+        if bad.any():
+            found.append(('identity', (int(np.argmax(bad)),)))
+
+    if rows is None:
+        return found
+    width = (n + 7) // 8
+    packed = np.frombuffer(bitsets.pack(rows, n), dtype=np.uint8)
+    S = np.unpackbits(packed.reshape(n, width), axis=1,
+                      bitorder='little')[:, :n].astype(bool)
+    L = S | np.eye(n, dtype=bool)
+
+    bad = S & S.T
+    if bad.any():
+        x, y = np.unravel_index(np.argmax(bad), bad.shape)
+        found.append(('antisymmetry', (int(x), int(y))))
+
+    Lf = L.astype(np.float32)
+    bad = (Lf.dot(Lf) > 0) & ~L
+    if bad.any():
+        x = int(np.argmax(bad.any(axis=1)))
+        for y in np.flatnonzero(S[x]):
+            missing = S[y] & ~L[x]
+            if missing.any():
+                found.append(('transitivity',
+                              (x, int(y), int(np.argmax(missing)))))
+                break
+
+    xs, ys = np.nonzero(S)
+    left = right = None
+    for start in range(0, len(xs), CHUNK):
+        cx = xs[start:start + CHUNK]
+        cy = ys[start:start + CHUNK]
+        if left is None:
+            # [z, k] tells whether z*x <= z*y for the k-th pair
+            ok = L[T[:, cx], T[:, cy]]
+            if not ok.all():
+                k = int(np.argmax(~ok.all(axis=0)))
+                left = (int(cx[k]), int(cy[k]), int(np.argmax(~ok[:, k])))
+        if right is None:
+            # [k, z] tells whether x*z <= y*z for the k-th pair
+            ok = L[T[cx], T[cy]]
+            if not ok.all():
+                k = int(np.argmax(~ok.all(axis=1)))
+                right = (int(cx[k]), int(cy[k]), int(np.argmax(~ok[k])))
+        if left is not None and right is not None:
+            break
+    if left is not None:
+        found.append(('left monotonicity', left))
+    if right is not None:
+        found.append(('right monotonicity', right))
+    return found
@@ -0,0 +1,325 @@
+"""
+Benchmarks for building partially ordered monoids. Each case is timed phase
+by phase (element generation, table generation, attach_order with its
+closure and reduction, product construction, export), and the peak memory
+allocated by each phase is recorded with tracemalloc in a separate run, so
+it does not slow down the timings.
+
+The cases are the models of article_examples and families that scale to
+thousands of elements: cyclic monoids <a | a^(n+k) = a^k>, free bands,
+free semilattices, iterated products with field, and an implicit product of
+three cyclic monoids.
+
+Usage:
+    python benchmarks.py [-o results.json] [--compare old.json] [case ...]
+"""
+import argparse
+import itertools
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from pomonoid import Pomonoid, ProductPomonoid, identity_relations
+from rewriting import RewritingSystem
+
+
+class PhaseTimer(object):
+    """
+    Records the wall time, and optionally the peak traced memory, of named
+    phases.
+
+    :param memory: whether tracemalloc is running and peaks are recorded
+    """
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.phases = OrderedDict()
+        self.size = None
+
+    @contextmanager
+    def phase(self, name):
+        if self.memory:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        yield
+        seconds = time.perf_counter() - start
+        result = {'seconds': seconds}
+        if self.memory:
+            result['peak_bytes'] = tracemalloc.get_traced_memory()[1] - base
+        self.phases[name] = result
+
+
+def cyclic(n, k=1):
+    """
+    The cyclic monoid <a | a^(n+k) = a^k>, with r = 1 so that it can be a
+    factor of a product. It is given the chain 1 <= a <= ... <= a^(n+k-1),
+    which is not compatible with the multiplication (a^(n+k) comes back
+    down to a^k, as verify() reports) and only serves as a workload for
+    closure and reduction.
+
+    :return: (keyword arguments of Pomonoid, ordering)
+    """
+    relations = {('a' * (n + k), 'a' * k), ('r', '1')}
+    ordering = set(('a' * i or '1', 'a' * (i + 1)) for i in range(n + k - 1))
+    return (dict(base_relations=relations | identity_relations('ar'),
+                 base_generators={'a', 'r'}),
+            ordering)
+
+
+def free_band(k):
+    """
+    The free band on k <= 3 generators, presented by ww = w for every word
+    w of length at most 2k, which is enough for the completion to be
+    confluent and finite. It is left unordered.
+
+    :return: (keyword arguments of Pomonoid, ordering)
+    """
+    letters = 'abc'[:k]
+    relations = set((''.join(w) * 2, ''.join(w))
+                     for n in range(1, 2 * k + 1)
+                     for w in itertools.product(letters, repeat=n))
+    return (dict(base_relations=relations | identity_relations(letters),
+                 base_generators=set(letters)),
+            set())
+
+
+def semilattice(k):
+    """
+    The free semilattice on k generators: the 2^k subsets of the generators
+    under union, ordered by reverse inclusion.
+
+    :return: (keyword arguments of Pomonoid, ordering)
+    """
+    letters = 'abcdefghijklmnop'[:k]
+    relations = set((c + c, c) for c in letters)
+    relations |= set((d + c, c + d)
+                     for c, d in itertools.combinations(letters, 2))
+    ordering = set()
+    for n in range(k):
+        for subset in itertools.combinations(letters, n):
+            for c in letters:
+                if c not in subset:
+                    bigger = ''.join(sorted(subset + (c,)))
+                    ordering.add((bigger, ''.join(subset) or '1'))
+    return (dict(base_relations=relations | identity_relations(letters),
+                 base_generators=set(letters)),
+            ordering)
+
+
+def build(timer, presentation, ordering, prefix='', backend='dict'):
+    """
+    Build a Pomonoid phase by phase.
+
+    :return: the Pomonoid
+    """
+    M = Pomonoid(lazy=True, **presentation)
+    with timer.phase(prefix + 'elements'):
+        M.build(table=False)
+    with timer.phase(prefix + 'table'):
+        M.operation._generate_table(M.normal_forms,
+                                    right_cayley=M.right_cayley,
+                                    backend=backend)
+    with timer.phase(prefix + 'order'):
+        M.attach_order(ordering=ordering)
+    timer.size = len(M.normal_forms)
+    return M
+
+
+def product(timer, M, N, prefix='', backend='dict'):
+    """
+    Form and export the product of M and N.
+
+    :return: the exported product
+    """
+    with timer.phase(prefix + 'product'):
+        P = ProductPomonoid(M, N, table_backend=backend)
+    with timer.phase(prefix + 'export'):
+        E = P.export()
+    timer.size = len(P.normal_forms)
+    return E
+
+
+def _model(name):
+    import article_examples
+    M = getattr(article_examples, name)
+    presentation = dict(base_relations=M.operation.relations,
+                        base_generators=M.operation.generators)
+    return presentation, M.order.pairs
+
+
+def article_case(name):
+    def run(timer, backend):
+        build(timer, *_model(name), backend=backend)
+    return run
+
+
+def product_case(*names):
+    """
+    Left to right product of article models, e.g. ('ZDLRb', 'ZDLRc',
+    'field') for largest_zdr; every intermediate product is exported.
+    """
+    def run(timer, backend):
+        result = build(timer, *_model(names[0]), prefix=names[0] + '.',
+                       backend=backend)
+        for name in names[1:]:
+            M = build(timer, *_model(name), prefix=name + '.',
+                      backend=backend)
+            result = product(timer, result, M, prefix=name + '.',
+                             backend=backend)
+    return run
+
+
+def family_case(family, *args):
+    def run(timer, backend):
+        build(timer, *family(*args), backend=backend)
+    return run
+
+
+def field_power_case(n, depth):
+    """
+    cyclic(n) multiplied by field depth times, exporting each product.
+    """
+    def run(timer, backend):
+        result = build(timer, *cyclic(n), backend=backend)
+        field = build(timer, *_model('field'), prefix='field.',
+                      backend=backend)
+        for i in range(depth):
+            result = product(timer, result, field, prefix='%d.' % (i + 1),
+                             backend=backend)
+    return run
+
+
+def implicit_case(*ns):
+    """
+    Implicit product of cyclic(n) for each n, with one row of products.
+    """
+    def run(timer, backend):
+        factors = [build(timer, *cyclic(n), prefix='%d.' % n,
+                         backend=backend) for n in ns]
+        with timer.phase('product'):
+            P = ProductPomonoid(*factors)
+        with timer.phase('row'):
+            P.operation.row(len(P.normal_forms) - 1)
+        timer.size = len(P.normal_forms)
+    return run
+
+
+CASES = OrderedDict([
+    ('kura', article_case('kura')),
+    ('dual', article_case('dual')),
+    ('largest_dual', product_case('dual', 'field')),
+    ('ZDLRbc', product_case('ZDLRb', 'ZDLRc')),
+    ('largest_zdr', product_case('ZDLRb', 'ZDLRc', 'field')),
+    ('cyclic-100', family_case(cyclic, 100)),
+    ('cyclic-1000', family_case(cyclic, 1000)),
+    ('cyclic-3000', family_case(cyclic, 3000, 10)),
+    ('free-band-2', family_case(free_band, 2)),
+    ('free-band-3', family_case(free_band, 3)),
+    ('semilattice-8', family_case(semilattice, 8)),
+    ('semilattice-11', family_case(semilattice, 11)),
+    ('field-power-3', field_power_case(301, 3)),
+    ('implicit-3', implicit_case(31, 37, 41)),
+])
+
+
+def run_case(name, repeat=1, memory=True, backend='dict'):
+    """
+    :param name: key of CASES
+    :param repeat: number of timed runs, the fastest time of each phase is
+        kept
+    :param memory: whether to make a further run measuring peak memory
+    :param backend: table backend passed to Pomonoid
+    :return: dict of the case name, size and phases
+    """
+    case = CASES[name]
+    runs = []
+    for _ in range(repeat):
+        # the article models, once imported, keep their rewriting systems
+        # and normal form caches alive; every run completes its own
+        RewritingSystem.unshare()
+        timer = PhaseTimer()
+        case(timer, backend)
+        runs.append(timer)
+    phases = OrderedDict(
+        (phase, {'seconds': min(t.phases[phase]['seconds'] for t in runs)})
+        for phase in runs[0].phases)
+    if memory:
+        timer = PhaseTimer(memory=True)
+        RewritingSystem.unshare()
+        tracemalloc.start()
+        try:
+            case(timer, backend)
+        finally:
+            tracemalloc.stop()
+        for phase, result in timer.phases.items():
+            phases[phase]['peak_bytes'] = result['peak_bytes']
+    return {'name': name,
+            'size': runs[0].size,
+            'seconds': sum(p['seconds'] for p in phases.values()),
+            'phases': phases}
+
+
+def compare(results, old):
+    """
+    Print the ratio of each phase time to the one in an earlier result file.
+    """
+    previous = dict((r['name'], r) for r in old['results'])
+    for result in results:
+        before = previous.get(result['name'])
+        if before is None:
+            continue
+        for phase, now in result['phases'].items():
+            then = before['phases'].get(phase)
+            if then and then['seconds']:
+                print("%-16s %-20s %8.3fs -> %8.3fs  x%.2f"
+                      % (result['name'], phase, then['seconds'],
+                         now['seconds'], now['seconds'] / then['seconds']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('cases', nargs='*', metavar='case',
+                        help='cases to run (default: all), among: %s'
+                             % ', '.join(CASES))
+    parser.add_argument('-o', '--output', help='write the results as JSON')
+    parser.add_argument('-r', '--repeat', type=int, default=1,
+                        help='timed runs per case')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='skip the peak memory run')
+    parser.add_argument('--backend', default='dict',
+                        choices=('dict', 'array', 'numpy'),
+                        help='Cayley table backend')
+    parser.add_argument('--compare', metavar='JSON',
+                        help='earlier results to compare against')
+    args = parser.parse_args(argv)
+
+    results = []
+    for name in args.cases or CASES:
+        if name not in CASES:
+            parser.error("unknown case %r" % name)
+        result = run_case(name, repeat=args.repeat,
+                          memory=not args.no_memory, backend=args.backend)
+        peak = max([p.get('peak_bytes', 0)
+                    for p in result['phases'].values()])
+        print("%-16s %6d elements %9.3fs  peak %7.1f MiB"
+              % (name, result['size'], result['seconds'], peak / 2.0 ** 20))
+        results.append(result)
+
+    report = {'python': sys.version.split()[0],
+              'platform': platform.platform(),
+              'backend': args.backend,
+              'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
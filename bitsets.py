@@ -0,0 +1,277 @@
+"""
+Relations on elements numbered 0..n-1, stored as one Python int per element.
+Bit j of rows[i] is set when element i is related to element j.
+"""
+
+
+def bits(row):
+    """
+    :param row: bitset (int)
+    :return: iterator over the positions of the set bits, lowest first
+    """
+    while row:
+        low = row & -row
+        yield low.bit_length() - 1
+        row ^= low
+
+
+def closure(rows, counts=None):
+    """
+    Transitive closure of a relation. Rows are completed in reverse
+    topological order, so each row is the union of its successors' finished
+    rows, which costs one big-int OR per pair of the relation. A relation with
+    cycles falls back to Warshall's algorithm on whole rows.
+
+    :param rows: list of bitsets
+    :param counts: optional Counter, given the number of row unions
+        ('closure unions') or of Warshall passes ('closure passes')
+    :return: new list of bitsets of the transitive closure
+    """
+    n = len(rows)
+    # Kahn's algorithm on the reversed relation gives sinks first
+    out_degree = [bin(row).count('1') for row in rows]
+    predecessors = [[] for _ in range(n)]
+    for i, row in enumerate(rows):
+        for j in bits(row):
+            predecessors[j].append(i)
+    order = [i for i in range(n) if not out_degree[i]]
+    for j in order:
+        for i in predecessors[j]:
+            out_degree[i] -= 1
+            if not out_degree[i]:
+                order.append(i)
+
+    result = list(rows)
+    if len(order) == n:
+        if counts is not None:
+            counts['closure unions'] += sum(bin(row).count('1')
+                                            for row in rows)
+        for i in order:
+            row = rows[i]
+            for j in bits(rows[i]):
+                row |= result[j]
+            result[i] = row
+        return result
+
+    if counts is not None:
+        counts['closure passes'] += n
+    for k in range(n):
+        bit = 1 << k
+        rk = result[k]
+        for i in range(n):
+            if result[i] & bit:
+                result[i] |= rk
+    return result
+
+
+def reduction(up, direct=None, counts=None):
+    """
+    Exact transitive reduction (the covering relation) of a transitive,
+    irreflexive relation. An element above x is a cover of x unless it is
+    above some element above x, and every element above x is above x through
+    one of the given direct pairs, so only those rows need to be combined.
+
+    :param up: list of bitsets of a transitive relation
+    :param direct: optional list of bitsets whose closure is up
+    :param counts: optional Counter, given the number of row unions
+        ('reduction unions')
+    :return: list of bitsets of the covering relation
+    """
+    if direct is None:
+        direct = up
+    if counts is not None:
+        counts['reduction unions'] += sum(bin(row).count('1')
+                                          for row in direct)
+    result = []
+    for i, row in enumerate(up):
+        above = 0
+        for j in bits(direct[i]):
+            above |= up[j]
+        result.append(row & ~above)
+    return result
+
+
+
+def width(up):
+    """
+    Size of the largest antichain of a strict partial order. By Dilworth's
+    theorem it is the number of elements less the size of a maximum matching
+    between lower and upper elements of related pairs, found by augmenting
+    paths.
+
+    :param up: list of bitsets of the strict up-sets
+    :return: int
+    """
+    n = len(up)
+    mate = [-1] * n
+    matched = [-1] * n
+    size = 0
+    for x in range(n):
+        parent = {}
+        visited = 0
+        stack = [x]
+        end = -1
+        while stack and end < 0:
+            u = stack.pop()
+            for y in bits(up[u] & ~visited):
+                visited |= 1 << y
+                parent[y] = u
+                if matched[y] < 0:
+                    end = y
+                    break
+                stack.append(matched[y])
+        if end < 0:
+            continue
+        size += 1
+        y = end
+        while True:
+            u = parent[y]
+            previous = mate[u]
+            matched[y] = u
+            mate[u] = y
+            if u == x:
+                break
+            y = previous
+    return n - size
+
+
+def transpose(rows, n):
+    """
+    :param rows: list of bitsets over n elements
+    :param n: number of elements
+    :return: list of bitsets of the converse relation
+    """
+    result = [0] * n
+    for i, row in enumerate(rows):
+        bit = 1 << i
+        for j in bits(row):
+            result[j] |= bit
+    return result
+
+
+class Poset(object):
+    """
+    A partial order on 0..n-1 as rows of strict up-sets, with the strict
+    down-sets (the transposed rows) built on first use. Sets of elements are
+    bitsets, so comparisons are a shift and intervals, joins and meets a few
+    operations on whole rows.
+
+    :param up: list of bitsets of the strict up-sets, transitively closed
+    """
+    def __init__(self, up):
+        self.up = up
+        self.n = len(up)
+        self._down = None
+
+    @property
+    def down(self):
+        if self._down is None:
+            self._down = transpose(self.up, self.n)
+        return self._down
+
+    def compare(self, i, j):
+        """
+        :return: True if j is i or above it
+        """
+        return i == j or bool(self.up[i] >> j & 1)
+
+    def up_set(self, i):
+        return self.up[i] | 1 << i
+
+    def down_set(self, i):
+        return self.down[i] | 1 << i
+
+    def interval(self, i, j):
+        """
+        :return: bitset of the elements between i and j, both included
+        """
+        return self.up_set(i) & self.down_set(j)
+
+    def least(self, mask):
+        """
+        :return: the element of mask below all the others, or None
+        """
+        for i in bits(mask):
+            if not mask & ~self.up_set(i):
+                return i
+        return None
+
+    def greatest(self, mask):
+        """
+        :return: the element of mask above all the others, or None
+        """
+        for i in bits(mask):
+            if not mask & ~self.down_set(i):
+                return i
+        return None
+
+    def join(self, i, j):
+        """
+        :return: the least upper bound of i and j, or None
+        """
+        return self.least(self.up_set(i) & self.up_set(j))
+
+    def meet(self, i, j):
+        """
+        :return: the greatest lower bound of i and j, or None
+        """
+        return self.greatest(self.down_set(i) & self.down_set(j))
+
+
+def permute(rows, position):
+    """
+    Renumber a relation so that element i becomes element position[i].
+
+    :param rows: list of bitsets
+    :param position: list giving the new number of each element
+    :return: list of bitsets of the renumbered relation
+    """
+    result = [0] * len(rows)
+    for i, row in enumerate(rows):
+        new = 0
+        for j in bits(row):
+            new |= 1 << position[j]
+        result[position[i]] = new
+    return result
+
+
+def pack(rows, n):
+    """
+    :param rows: list of bitsets over n elements
+    :param n: number of elements
+    :return: bytes holding the rows, (n + 7) // 8 little-endian bytes each
+    """
+    width = (n + 7) // 8
+    return b''.join(row.to_bytes(width, 'little') for row in rows)
+
+
+class PackedRows(object):
+    """
+    Read-only list of bitsets stored packed in a buffer, for instance a
+    memory-mapped file. Rows are converted to ints when first used.
+
+    :param buffer: bytes-like object holding the rows as written by pack
+    :param n: number of elements
+    """
+    def __init__(self, buffer, n):
+        self._buffer = memoryview(buffer)
+        self._width = (n + 7) // 8
+        self._rows = {}
+        self._n = n
+
+    def __getitem__(self, i):
+        row = self._rows.get(i)
+        if row is None:
+            if not 0 <= i < self._n:
+                raise IndexError(i)
+            start = i * self._width
+            row = int.from_bytes(self._buffer[start:start + self._width],
+                                 'little')
+            self._rows[i] = row
+        return row
+
+    def __len__(self):
+        return self._n
+
+    def __iter__(self):
+        return (self[i] for i in range(self._n))
@@ -0,0 +1,215 @@
+"""
+A catalogue of computed pomonoids in an SQLite database. Each model is
+stored with the parts written by storage.encode (the presentation and normal
+forms as JSON, the packed table and order rows as blobs) next to indexed
+invariant columns:
+
+    size         number of elements
+    idempotents  number of idempotents
+    commutative  1 if the multiplication is commutative
+    hasse_edges  number of covering pairs
+    width        size of the largest antichain
+    height       number of elements of the longest chain
+    maximal      number of maximal elements
+    minimal      number of minimal elements
+    hash         isomorphism.canonical_hash, if computed
+
+The order columns are NULL for unordered models. Queries only read these
+columns; a model is rebuilt from its blobs when load is called.
+
+Usage:
+    with Catalogue('models.db') as catalogue:
+        catalogue.add_many(models.items())
+        for entry in catalogue.find(size=28, maximal=1):
+            M = catalogue.load(entry.id)
+"""
+import json
+import sqlite3
+from collections import namedtuple
+
+import bitsets
+import isomorphism
+import storage
+
+INVARIANTS = ('size', 'idempotents', 'commutative', 'hasse_edges', 'width',
+              'height', 'maximal', 'minimal', 'hash')
+
+Entry = namedtuple('Entry', ('id', 'name') + INVARIANTS)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS models (
+    id INTEGER PRIMARY KEY,
+    name TEXT,
+    size INTEGER NOT NULL,
+    idempotents INTEGER NOT NULL,
+    commutative INTEGER NOT NULL,
+    hasse_edges INTEGER,
+    width INTEGER,
+    height INTEGER,
+    maximal INTEGER,
+    minimal INTEGER,
+    hash TEXT,
+    header TEXT NOT NULL,
+    tbl BLOB NOT NULL,
+    rows BLOB NOT NULL
+);
+""" + ''.join("CREATE INDEX IF NOT EXISTS models_%s ON models (%s);\n"
+              % (column, column) for column in ('name',) + INVARIANTS)
+
+
+def invariants(header, data, rows):
+    """
+    :param header, data, rows: parts of a model written by storage.encode
+    :return: dict of the invariant columns, hash excluded
+    """
+    n = len(header['words'])
+    table = memoryview(data).cast(header['typecode'])
+
+    def prod(i, j):
+        return table[j * n + i]
+
+    result = {
+        'size': n,
+        'idempotents': sum(1 for i in range(n) if prod(i, i) == i),
+        'commutative': int(all(prod(i, j) == prod(j, i)
+                               for i in range(n) for j in range(i))),
+        'hasse_edges': None, 'width': None, 'height': None,
+        'maximal': None, 'minimal': None,
+    }
+    if header['ordered']:
+        size = n * ((n + 7) // 8)
+        up = list(bitsets.PackedRows(rows[:size], n))
+        covers = list(bitsets.PackedRows(rows[size:2 * size], n))
+        below = [0] * n
+        for row in covers:
+            for j in bitsets.bits(row):
+                below[j] += 1
+        minimal = below.count(0)
+        # the longest chain ending at j is one longer than one below it
+        chain = [1] * n
+        todo = [i for i in range(n) if not below[i]]
+        for i in todo:
+            for j in bitsets.bits(covers[i]):
+                chain[j] = max(chain[j], chain[i] + 1)
+                below[j] -= 1
+                if not below[j]:
+                    todo.append(j)
+        result.update(
+            hasse_edges=sum(bin(row).count('1') for row in covers),
+            width=bitsets.width(up),
+            height=max(chain) if n else 0,
+            maximal=sum(1 for row in covers if not row),
+            minimal=minimal)
+    return result
+
+
+class Catalogue(object):
+    """
+    :param path: database file name, ':memory:' for a temporary catalogue
+    :param canonical: whether to record the canonical hash of added models
+    """
+    def __init__(self, path=':memory:', canonical=True):
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+        self.canonical = canonical
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _row(self, name, monoid):
+        header, data, rows = storage.encode(monoid)
+        values = invariants(header, data, rows)
+        if self.canonical:
+            values['hash'] = isomorphism.canonical_hash(monoid)
+        else:
+            values['hash'] = None
+        return ((name,) + tuple(values[c] for c in INVARIANTS)
+                + (json.dumps(header), data, rows))
+
+    def add(self, monoid, name=None):
+        """
+        :return: id of the stored model
+        """
+        return self.add_many([(name, monoid)])[0]
+
+    def add_many(self, models):
+        """
+        Store models in one transaction.
+
+        :param models: iterable of (name, Pomonoid) pairs
+        :return: list of the ids of the stored models
+        """
+        columns = ('name',) + INVARIANTS + ('header', 'tbl', 'rows')
+        statement = 'INSERT INTO models (%s) VALUES (%s)' % (
+            ', '.join(columns), ', '.join('?' * len(columns)))
+        ids = []
+        with self.connection:
+            cursor = self.connection.cursor()
+            for name, monoid in models:
+                cursor.execute(statement, self._row(name, monoid))
+                ids.append(cursor.lastrowid)
+        return ids
+
+    @staticmethod
+    def _where(criteria):
+        """
+        :param criteria: column=value, or column=(low, high) for a range
+            where either bound may be None
+        :return: (SQL condition, parameters)
+        """
+        clauses = []
+        parameters = []
+        for column, value in sorted(criteria.items()):
+            if column not in INVARIANTS and column != 'name':
+                raise ValueError("unknown column %r" % column)
+            if isinstance(value, tuple):
+                low, high = value
+                if low is not None:
+                    clauses.append('%s >= ?' % column)
+                    parameters.append(low)
+                if high is not None:
+                    clauses.append('%s <= ?' % column)
+                    parameters.append(high)
+            elif value is None:
+                clauses.append('%s IS NULL' % column)
+            else:
+                clauses.append('%s = ?' % column)
+                parameters.append(value)
+        return ' AND '.join(clauses) or '1', parameters
+
+    def find(self, **criteria):
+        """
+        e.g. find(size=28, maximal=1) or find(size=(10, 20), commutative=1)
+
+        :return: list of Entry rows, without loading the models
+        """
+        condition, parameters = self._where(criteria)
+        cursor = self.connection.execute(
+            'SELECT id, name, %s FROM models WHERE %s ORDER BY id'
+            % (', '.join(INVARIANTS), condition), parameters)
+        return [Entry(*row) for row in cursor]
+
+    def count(self, **criteria):
+        condition, parameters = self._where(criteria)
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM models WHERE %s' % condition,
+            parameters).fetchone()[0]
+
+    def load(self, id):
+        """
+        :param id: id of a stored model
+        :return: the model as a Pomonoid, like the result of storage.load
+        """
+        row = self.connection.execute(
+            'SELECT header, tbl, rows FROM models WHERE id = ?',
+            (id,)).fetchone()
+        if row is None:
+            raise KeyError(id)
+        header, data, rows = row
+        return storage.decode(json.loads(header), data, rows)
@@ -0,0 +1,203 @@
+import operator
+from array import array
+from collections.abc import Mapping
+
+
+def typecode(n):
+    """
+    :param n: number of distinct ids to store
+    :return: smallest unsigned array typecode able to hold ids 0..n-1
+    """
+    for code in 'BHIL':
+        if n <= 2 ** (8 * array(code).itemsize):
+            return code
+    return 'Q'
+
+
+def gather(values, indices):
+    """
+    :return: tuple (values[i] for i in indices), computed at C speed
+    """
+    if len(indices) == 1:
+        return (values[indices[0]],)
+    return operator.itemgetter(*indices)(values)
+
+
+def spanning_tree(words, right_cayley):
+    """
+    Breadth first spanning tree of the right Cayley graph from the identity.
+
+    :param words: list of elements, starting with the identity
+    :param right_cayley: dict {x: {g: x*g}} covering every element
+    :return: (dict from each generator to the list of ids of x*g by id x,
+              list of (id, parent id, generator) in order of discovery, so
+              that parents come first; the identity has no parent)
+    """
+    ids = dict((w, i) for i, w in enumerate(words))
+    generators = list(right_cayley[words[0]])
+    right = dict((g, [ids[right_cayley[x][g]] for x in words])
+                 for g in generators)
+    tree = [(0, None, None)]
+    seen = {0}
+    for j, _, _ in tree:
+        for g in generators:
+            k = right[g][j]
+            if k not in seen:
+                seen.add(k)
+                tree.append((k, j, g))
+    return right, tree
+
+
+class _TableRow(Mapping):
+    """
+    Read-only view of one row of a CayleyTable, keyed by words.
+    """
+    def __init__(self, table, i):
+        self._table = table
+        self._i = i
+
+    def __getitem__(self, y):
+        table = self._table
+        return table.words[table.prod_id(self._i, table.ids[y])]
+
+    def __iter__(self):
+        return iter(self._table.words)
+
+    def __len__(self):
+        return len(self._table.words)
+
+
+class CayleyTable(Mapping):
+    """
+    A multiplication table over elements numbered 0..n-1. Entries are ids
+    stored column by column in a compact integer array, or in a NumPy matrix,
+    so an entry costs one to four bytes. As a Mapping the table can still be
+    used as table[x][y] with words, like the dict-of-dicts tables.
+
+    :param words: list of elements, indexed by id
+    :param columns: sequence of n columns, column j listing the ids of x*j
+    :param backend: 'array' or 'numpy'
+    """
+    def __init__(self, words, columns, backend='array'):
+        self.words = list(words)
+        self.ids = dict((w, i) for i, w in enumerate(self.words))
+        self.size = n = len(self.words)
+        self.backend = backend
+        if backend == 'numpy':
+            import numpy as np
+            self.data = np.empty((n, n), dtype=np.dtype(typecode(n)))
+            for j, column in enumerate(columns):
+                self.data[:, j] = column
+        elif backend == 'array':
+            self.data = array(typecode(n))
+            for column in columns:
+                self.data.extend(column)
+        else:
+            raise ValueError("unknown table backend %r" % backend)
+
+    @classmethod
+    def from_cayley_graph(cls, words, right_cayley, backend='array'):
+        """
+        Compose the table from the right Cayley graph. words[0] must be the
+        identity. Every other element is its parent in the breadth first
+        spanning tree times a generator, so its column is obtained from the
+        parent's column by one step along that generator's edges.
+
+        :param words: list of elements, starting with the identity
+        :param right_cayley: dict {x: {g: x*g}} covering every element
+        :param backend: 'array' or 'numpy'
+        """
+        right, tree = spanning_tree(words, right_cayley)
+        generators = list(right)
+        n = len(words)
+        columns = [None] * n
+        if backend == 'numpy':
+            import numpy as np
+            right = dict((g, np.array(right[g], dtype=np.intp))
+                         for g in generators)
+            columns[0] = np.arange(n, dtype=np.intp)
+            for j, parent, g in tree[1:]:
+                columns[j] = right[g][columns[parent]]
+        else:
+            columns[0] = tuple(range(n))
+            for j, parent, g in tree[1:]:
+                columns[j] = gather(right[g], columns[parent])
+        return cls(words, columns, backend=backend)
+
+    @classmethod
+    def from_buffer(cls, words, data):
+        """
+        Wrap ids already laid out column by column, such as a memory-mapped
+        array, without copying them.
+
+        :param words: list of elements, indexed by id
+        :param data: indexable buffer of n*n ids, e.g. a cast memoryview
+        """
+        table = cls.__new__(cls)
+        table.words = list(words)
+        table.ids = dict((w, i) for i, w in enumerate(table.words))
+        table.size = len(table.words)
+        table.backend = 'array'
+        table.data = data
+        return table
+
+    @classmethod
+    def from_dict(cls, table, words=None, backend='array'):
+        """
+        :param table: dict-of-dicts table {x: {y: x*y}}
+        :param words: optional list fixing the numbering of the elements
+        :param backend: 'array' or 'numpy'
+        """
+        if words is None:
+            words = list(table)
+        ids = dict((w, i) for i, w in enumerate(words))
+        try:
+            columns = [[ids[table[x][y]] for x in words] for y in words]
+        except KeyError as e:
+            raise ValueError("table is not closed: %r is not an element"
+                             % (e.args[0],))
+        return cls(words, columns, backend=backend)
+
+    def prod_id(self, i, j):
+        """
+        :param i, j: element ids
+        :return: id of the product of elements i and j
+        """
+        if self.backend == 'numpy':
+            return int(self.data[i, j])
+        return self.data[j * self.size + i]
+
+    def prod(self, x, y):
+        """
+        :param x, y: elements
+        :return: product of x and y, as an element
+        """
+        return self.words[self.prod_id(self.ids[x], self.ids[y])]
+
+    def column(self, j):
+        """
+        :param j: element id
+        :return: ids of x*j for every id x
+        """
+        if self.backend == 'numpy':
+            return self.data[:, j]
+        return self.data[j * self.size:(j + 1) * self.size]
+
+    def as_dict(self):
+        """
+        :return: the table as a dict-of-dicts keyed by words
+        """
+        words = self.words
+        columns = [self.column(j) for j in range(self.size)]
+        return dict((x, dict((y, words[columns[j][i]])
+                             for j, y in enumerate(words)))
+                    for i, x in enumerate(words))
+
+    def __getitem__(self, x):
+        return _TableRow(self, self.ids[x])
+
+    def __iter__(self):
+        return iter(self.words)
+
+    def __len__(self):
+        return self.size
@@ -0,0 +1,49 @@
+"""
+Congruences of a finite monoid, computed on the ids of its Cayley table.
+
+The least congruence containing some pairs is found by union-find: whenever
+two classes are merged, the pair that merged them is multiplied on the left
+and on the right by each generator, and the products are merged in turn.
+There are fewer unions than elements, so this takes O(n * generators) steps
+besides the near constant union-find operations.
+"""
+
+
+def find(parent, i):
+    """
+    :return: root of the class of i, halving the path to it on the way
+    """
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def closure(table, generators, pairs):
+    """
+    :param table: CayleyTable of a monoid generated by the given generators
+    :param generators: ids of the generators in table
+    :param pairs: iterable of pairs of ids to be identified
+    :return: list giving the root of the class of each id
+    """
+    n = table.size
+    right = [table.column(g) for g in generators]
+    left = [[table.prod_id(g, x) for x in range(n)] for g in generators]
+    parent = list(range(n))
+    size = [1] * n
+    todo = list(pairs)
+    while todo:
+        x, y = todo.pop()
+        a = find(parent, x)
+        b = find(parent, y)
+        if a == b:
+            continue
+        if size[a] < size[b]:
+            a, b = b, a
+        parent[b] = a
+        size[a] += size[b]
+        for column in right:
+            todo.append((column[x], column[y]))
+        for row in left:
+            todo.append((row[x], row[y]))
+    return [find(parent, i) for i in range(n)]
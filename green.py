@@ -0,0 +1,253 @@
+"""
+Green's relations of a finite monoid. Two elements are R-related when they
+generate the same right ideal, xM = yM, which happens exactly when each can
+be reached from the other in the right Cayley graph (edges x -> x*g), so
+the R-classes are its strongly connected components. The same holds for L
+and the left Cayley graph (edges x -> g*x), and for J and the union of both
+graphs. H is the intersection of R and L, and in a finite monoid D = J.
+
+Both graphs are built once from the right Cayley graph of the enumeration:
+every element other than the identity is its parent in the breadth first
+spanning tree times a generator, so g*x is g*parent times that generator.
+Components are found by Tarjan's algorithm, so the classes take time linear
+in the number of elements times the number of generators, without the
+multiplication table. Idempotents only need its diagonal.
+"""
+from cayley import spanning_tree
+
+
+def components(n, columns):
+    """
+    Strongly connected components by Tarjan's algorithm, without recursion.
+
+    :param n: number of vertices
+    :param columns: lists giving, for each vertex, one of its successors
+    :return: (component of each vertex, number of components); components
+        are numbered so that edges only lead to equal or smaller numbers
+    """
+    index = [-1] * n
+    low = [0] * n
+    on_stack = [False] * n
+    stack = []
+    component = [-1] * n
+    count = 0
+    counter = 0
+    degree = len(columns)
+    for root in range(n):
+        if index[root] != -1:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        work = [[root, 0]]
+        while work:
+            frame = work[-1]
+            v, i = frame
+            if i < degree:
+                frame[1] += 1
+                w = columns[i][v]
+                if index[w] == -1:
+                    index[w] = low[w] = counter
+                    counter += 1
+                    stack.append(w)
+                    on_stack[w] = True
+                    work.append([w, 0])
+                elif on_stack[w] and index[w] < low[v]:
+                    low[v] = index[w]
+                continue
+            work.pop()
+            if work:
+                u = work[-1][0]
+                if low[v] < low[u]:
+                    low[u] = low[v]
+            if low[v] == index[v]:
+                while True:
+                    w = stack.pop()
+                    on_stack[w] = False
+                    component[w] = count
+                    if w == v:
+                        break
+                count += 1
+    return component, count
+
+
+def cayley_graph(monoid):
+    """
+    :param monoid: Pomonoid, product or export
+    :return: (list of elements by id, dict from each generator to the list
+        of ids of x*g by id x, spanning tree as a list of (id, parent id,
+        generator) with parents first, starting with the identity)
+    """
+    operation = monoid.operation
+    if getattr(monoid, 'implicit', False):
+        tree = [(k, operation.parent[k], operation.letter[k])
+                for k in range(len(operation.components))]
+        return operation.components, operation.right, tree
+    if getattr(monoid, 'right_cayley', None):
+        words = monoid.normal_forms
+        right, tree = spanning_tree(words, monoid.right_cayley)
+        return words, right, tree
+
+    table = operation.id_table()
+    ids = table.ids
+    right = dict((g, list(table.column(ids[operation.evaluate(g)])))
+                 for g in operation.ordered_generators)
+    identity = ids[operation.evaluate('')]
+    tree = [(identity, None, None)]
+    seen = {identity}
+    for j, _, _ in tree:
+        for g, column in right.items():
+            k = column[j]
+            if k not in seen:
+                seen.add(k)
+                tree.append((k, j, g))
+    return table.words, right, tree
+
+
+class GreenRelations(object):
+    """
+    Green's relations, idempotents and ideals of a Pomonoid, computed from
+    its left and right Cayley graphs. Classes are lists of elements, and the
+    class of an element is found through the id of its class in r, l, h and
+    j. The minimal ideal is the J-class every two-sided ideal contains.
+
+    :param monoid: Pomonoid, product or export
+    """
+    def __init__(self, monoid):
+        self.monoid = monoid
+        self.operation = monoid.operation
+        self.words, self.right, self.tree = cayley_graph(monoid)
+        self.ids = dict((w, i) for i, w in enumerate(self.words))
+        n = self.n = len(self.words)
+        self.generators = list(self.right)
+        self.left = {}
+        for g, column in self.right.items():
+            left = [None] * n
+            left[self.tree[0][0]] = column[self.tree[0][0]]
+            for k, parent, h in self.tree[1:]:
+                left[k] = self.right[h][left[parent]]
+            self.left[g] = left
+        right = list(self.right.values())
+        left = list(self.left.values())
+        self.r, self.r_count = components(n, right)
+        self.l, self.l_count = components(n, left)
+        self.j, self.j_count = components(n, right + left)
+        pairs = {}
+        self.h = [pairs.setdefault(pair, len(pairs))
+                  for pair in zip(self.r, self.l)]
+        self.h_count = len(pairs)
+        self._idempotents = None
+
+    def _classes(self, labels, count):
+        result = [[] for _ in range(count)]
+        for x, c in zip(self.words, labels):
+            result[c].append(x)
+        return result
+
+    @property
+    def R(self):
+        return self._classes(self.r, self.r_count)
+
+    @property
+    def L(self):
+        return self._classes(self.l, self.l_count)
+
+    @property
+    def H(self):
+        return self._classes(self.h, self.h_count)
+
+    @property
+    def J(self):
+        return self._classes(self.j, self.j_count)
+
+    D = J
+
+    def r_class(self, x):
+        return self._class_of(self.r, x)
+
+    def l_class(self, x):
+        return self._class_of(self.l, x)
+
+    def h_class(self, x):
+        return self._class_of(self.h, x)
+
+    def j_class(self, x):
+        return self._class_of(self.j, x)
+
+    def _class_of(self, labels, x):
+        c = labels[self.ids[x]]
+        return [y for y, d in zip(self.words, labels) if d == c]
+
+    @property
+    def idempotents(self):
+        """
+        :return: list of the elements e with e*e = e
+        """
+        if self._idempotents is None:
+            operation = self.operation
+            if getattr(self.monoid, 'implicit', False):
+                square = [operation.prod_id(k, k) for k in range(self.n)]
+            else:
+                table = operation.id_table()
+                square = [self.ids[table.words[table.prod_id(i, i)]]
+                          for i in (table.ids[x] for x in self.words)]
+            self._idempotents = [x for k, x in enumerate(self.words)
+                                 if square[k] == k]
+        return self._idempotents
+
+    def _reach(self, x, columns):
+        start = self.ids[x]
+        seen = {start}
+        todo = [start]
+        while todo:
+            y = todo.pop()
+            for column in columns:
+                z = column[y]
+                if z not in seen:
+                    seen.add(z)
+                    todo.append(z)
+        return [self.words[i] for i in sorted(seen)]
+
+    def right_ideal(self, x):
+        """
+        :return: list of the elements of xM
+        """
+        return self._reach(x, list(self.right.values()))
+
+    def left_ideal(self, x):
+        """
+        :return: list of the elements of Mx
+        """
+        return self._reach(x, list(self.left.values()))
+
+    def ideal(self, x):
+        """
+        :return: list of the elements of MxM
+        """
+        return self._reach(x, list(self.right.values())
+                           + list(self.left.values()))
+
+    @property
+    def minimal_ideal(self):
+        """
+        :return: list of the elements of the minimal ideal, the J-class
+            which no edge leaves
+        """
+        return self.J[0]
+
+    def egg_box(self, x):
+        """
+        :param x: element
+        :return: the D-class of x as rows of R-classes and columns of
+            L-classes, each cell the list of elements of an H-class
+        """
+        c = self.j[self.ids[x]]
+        members = [i for i in range(self.n) if self.j[i] == c]
+        rows = sorted(set(self.r[i] for i in members))
+        columns = sorted(set(self.l[i] for i in members))
+        box = [[[] for _ in columns] for _ in rows]
+        for i in members:
+            box[rows.index(self.r[i])][columns.index(self.l[i])].append(
+                self.words[i])
+        return box
@@ -0,0 +1,197 @@
+"""
+Hasse diagrams of ordered Pomonoids as DOT, JSON or GraphML text, written
+line by line from the cover lists of the order, so that neither the n^2
+pairs of elements nor the Python graphviz package are needed. Elements can
+be layered by rank, the length of the longest chain below them, computed in
+one pass over the covers in topological order.
+
+DOT files are rendered by the graphviz `dot` program when it is installed;
+render runs one `dot` process per file, several at a time, so a whole
+gallery of models is regenerated in parallel.
+"""
+import json
+import os
+import shutil
+import subprocess
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from xml.sax.saxutils import quoteattr
+
+FORMATS = {'.dot': 'dot', '.gv': 'dot', '.json': 'json', '.graphml': 'graphml'}
+
+
+def diagram(monoid):
+    """
+    :param monoid: Pomonoid with an order
+    :return: (labels of the elements, list of the ids of the upper covers of
+        each element)
+    """
+    order = monoid.order
+    elements = getattr(monoid, 'normal_forms', None)
+    if elements is None:
+        elements = sorted(monoid.elements, key=str)
+    label = getattr(monoid, 'word', str)
+    ids = dict((x, i) for i, x in enumerate(elements))
+    covers = [[ids[y] for y in order.upper_covers(x)] for x in elements]
+    return [label(x) for x in elements], covers
+
+
+def ranks(covers):
+    """
+    :param covers: list of the ids of the upper covers of each element
+    :return: list of the rank of each element, 0 for the minimal elements
+    """
+    n = len(covers)
+    below = [0] * n
+    for row in covers:
+        for y in row:
+            below[y] += 1
+    rank = [0] * n
+    todo = deque(x for x in range(n) if not below[x])
+    while todo:
+        x = todo.popleft()
+        for y in covers[x]:
+            if rank[y] <= rank[x]:
+                rank[y] = rank[x] + 1
+            below[y] -= 1
+            if not below[y]:
+                todo.append(y)
+    return rank
+
+
+def _quote(text):
+    return '"%s"' % str(text).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def write_dot(labels, covers, out, rank=None):
+    """
+    :param labels: labels of the elements
+    :param covers: list of the ids of the upper covers of each element
+    :param out: file object
+    :param rank: optional ranks, each rank is drawn on one level
+    """
+    out.write('digraph {\n')
+    for i, label in enumerate(labels):
+        out.write('\tn%d [label=%s]\n' % (i, _quote(label)))
+    if rank is not None:
+        levels = {}
+        for i, r in enumerate(rank):
+            levels.setdefault(r, []).append('n%d' % i)
+        for r in sorted(levels):
+            out.write('\t{rank=same; %s}\n' % '; '.join(levels[r]))
+    for i, row in enumerate(covers):
+        for j in row:
+            out.write('\tn%d -> n%d\n' % (i, j))
+    out.write('}\n')
+
+
+def write_json(labels, covers, out, rank=None):
+    """
+    Write {"nodes": [{"id", "label"[, "rank"]}], "edges": [[lower, upper]]}.
+    """
+    out.write('{"nodes": [')
+    for i, label in enumerate(labels):
+        node = {'id': i, 'label': str(label)}
+        if rank is not None:
+            node['rank'] = rank[i]
+        out.write((',\n  ' if i else '\n  ') + json.dumps(node))
+    out.write('\n], "edges": [')
+    first = True
+    for i, row in enumerate(covers):
+        for j in row:
+            out.write(('\n  ' if first else ',\n  ') + '[%d, %d]' % (i, j))
+            first = False
+    out.write('\n]}\n')
+
+
+def write_graphml(labels, covers, out, rank=None):
+    """
+    Write a directed GraphML graph, with the label and rank as node data.
+    """
+    out.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+              '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+              '  <key id="label" for="node" attr.name="label"'
+              ' attr.type="string"/>\n')
+    if rank is not None:
+        out.write('  <key id="rank" for="node" attr.name="rank"'
+                  ' attr.type="int"/>\n')
+    out.write('  <graph edgedefault="directed">\n')
+    for i, label in enumerate(labels):
+        out.write('    <node id="n%d"><data key="label">%s</data>'
+                  % (i, quoteattr(str(label))[1:-1]))
+        if rank is not None:
+            out.write('<data key="rank">%d</data>' % rank[i])
+        out.write('</node>\n')
+    for i, row in enumerate(covers):
+        for j in row:
+            out.write('    <edge source="n%d" target="n%d"/>\n' % (i, j))
+    out.write('  </graph>\n</graphml>\n')
+
+
+WRITERS = {'dot': write_dot, 'json': write_json, 'graphml': write_graphml}
+
+
+def export(monoid, path, format=None, layered=False):
+    """
+    Write the Hasse diagram of monoid to a file.
+
+    :param monoid: Pomonoid with an order
+    :param path: file name
+    :param format: 'dot', 'json' or 'graphml', by default from the extension
+        of path, DOT if there is none
+    :param layered: whether to record the rank of each element
+    """
+    if format is None:
+        format = FORMATS.get(os.path.splitext(path)[1], 'dot')
+    labels, covers = diagram(monoid)
+    rank = ranks(covers) if layered else None
+    with open(path, 'w') as out:
+        WRITERS[format](labels, covers, out, rank)
+
+
+def _render(job):
+    source, target, format, dot = job
+    subprocess.run([dot, '-T' + format, '-o', target, source], check=True)
+    return target
+
+
+def render(sources, format='png', workers=None, dot='dot'):
+    """
+    Render DOT files with the dot program, each to source.format next to
+    the source.
+
+    :param sources: DOT file names
+    :param format: output format of dot
+    :param workers: number of dot processes at a time, by default the number
+        of CPUs
+    :param dot: name or path of the dot program
+    :return: list of the rendered file names
+    """
+    program = shutil.which(dot)
+    if program is None:
+        raise OSError("the graphviz program %r was not found" % dot)
+    jobs = [(source, '%s.%s' % (source, format), format, program)
+            for source in sources]
+    with ThreadPoolExecutor(workers or os.cpu_count()) as pool:
+        return list(pool.map(_render, jobs))
+
+
+def draw_all(models, directory='img', format='png', layered=False,
+             workers=None):
+    """
+    Write the DOT file of each model into directory and render them all,
+    if the dot program is installed.
+
+    :param models: dict from file names to ordered Pomonoids
+    :return: list of the written file names, rendered ones included
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    sources = []
+    for name, monoid in models.items():
+        path = os.path.join(directory, name)
+        export(monoid, path, format='dot', layered=layered)
+        sources.append(path)
+    if shutil.which('dot') is None:
+        return sources
+    return sources + render(sources, format=format, workers=workers)
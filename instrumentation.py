@@ -0,0 +1,107 @@
+"""
+Optional instrumentation of monoid construction. A Stats object collects the
+wall time of each phase, event counters, and the number of times each
+rewriting rule is applied, and can stream events to a callback.
+
+Instrumented objects keep stats = None unless one is given, and check for
+None before recording anything, so leaving instrumentation off costs one
+attribute test per call.
+"""
+import logging
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager, nullcontext
+
+_NULL = nullcontext()
+
+
+class Stats(object):
+    """
+    Rewrite counts are kept per (lhs, rhs) rule. Words found in the shared
+    normal form cache are not rewritten again, so only the rewrite steps
+    actually performed are counted.
+
+    :param hook: optional callable receiving (event, data), data being a
+        dict, for the 'start' and 'end' of each phase, for progress events
+        such as 'enumerated', and for the 'summary'; see log_hook
+    """
+    def __init__(self, hook=None):
+        self.hook = hook
+        self.timings = OrderedDict()
+        self.counters = Counter()
+        self.rewrites = Counter()
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Time a phase; time spent in phases of the same name adds up.
+
+        :param name: name of the phase
+        """
+        self.emit('start', phase=name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.timings[name] = self.timings.get(name, 0.0) + seconds
+            self.emit('end', phase=name, seconds=seconds)
+
+    def count(self, name, n=1):
+        """
+        :param name: name of the counter
+        :param n: amount to add
+        """
+        self.counters[name] += n
+
+    def emit(self, event, **data):
+        """
+        Pass an event to the hook, if there is one.
+        """
+        if self.hook is not None:
+            self.hook(event, data)
+
+    def summary(self):
+        """
+        Also pass the result to the hook as a 'summary' event.
+
+        :return: dict of the timings, counters and rewrite counts, with rules
+            written as 'lhs -> rhs'
+        """
+        result = {'timings': dict(self.timings),
+                  'counters': dict(self.counters),
+                  'rewrites': dict(('%s -> %s' % rule, n)
+                                   for rule, n in self.rewrites.most_common())}
+        self.emit('summary', **result)
+        return result
+
+    def reset(self):
+        self.timings.clear()
+        self.counters.clear()
+        self.rewrites.clear()
+
+
+def phase(stats, name):
+    """
+    :param stats: Stats or None
+    :param name: name of the phase
+    :return: context manager timing the phase, doing nothing without stats
+    """
+    if stats is None:
+        return _NULL
+    return stats.phase(name)
+
+
+def log_hook(logger=None, level=logging.INFO):
+    """
+    :param logger: logging.Logger, by default the 'pomonoid' logger
+    :param level: logging level of the records
+    :return: hook for Stats writing each event to the log
+    """
+    if logger is None:
+        logger = logging.getLogger('pomonoid')
+
+    def hook(event, data):
+        logger.log(level, "%s %s", event,
+                   ' '.join('%s=%s' % item for item in sorted(data.items())))
+    return hook
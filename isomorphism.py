@@ -0,0 +1,274 @@
+"""
+Isomorphism testing and canonical forms of partially ordered monoids. An
+isomorphism is a bijection of the elements respecting both the
+multiplication and the order; generators and words play no part.
+
+Cheap invariants (the number of elements and idempotents, the number of
+distinct entries in each row and column of the table, and the up and down
+degrees in the Hasse diagram) settle most non-isomorphic pairs. Otherwise a
+canonical labelling is found by individualisation and refinement: elements
+are coloured by those invariants, and the colouring is refined until it is
+stable, each element looking at the colours of its products with every
+element, of the pairs multiplying to it and of its covers. While some colour
+is shared, each of its elements is in turn given a colour of its own and the
+search continues below it. Once one element of each generator is singled
+out the colouring becomes discrete, so the search tree is small unless the
+monoid has many automorphisms, and those found along the way prune the
+branches they map onto each other.
+
+Each discrete colouring numbers the elements, and the smallest multiplication
+table and cover list obtained that way is the canonical form.
+"""
+import hashlib
+from collections import Counter
+
+
+class Structure(object):
+    """
+    The multiplication and covering relation of a Pomonoid, on the ids of its
+    Cayley table.
+
+    :param monoid: Pomonoid, unordered if it has no order attached
+    """
+    def __init__(self, monoid):
+        table = monoid.operation.id_table()
+        self.words = table.words
+        n = self.n = table.size
+        columns = [list(table.column(j)) for j in range(n)]
+        self.prod = [[columns[y][x] for y in range(n)] for x in range(n)]
+        self.covers = [[] for _ in range(n)]
+        self.lower = [[] for _ in range(n)]
+        order = getattr(monoid, 'order', None)
+        if order is not None:
+            ids = table.ids
+            for x in range(n):
+                for y in order.upper_covers(self.words[x]):
+                    self.covers[x].append(ids[y])
+                    self.lower[ids[y]].append(x)
+        self._preimages = None
+
+    @property
+    def preimages(self):
+        """
+        :return: list of the pairs (x, y) with x*y = z, for each id z
+        """
+        if self._preimages is None:
+            self._preimages = [[] for _ in range(self.n)]
+            for x, row in enumerate(self.prod):
+                for y, z in enumerate(row):
+                    self._preimages[z].append((x, y))
+        return self._preimages
+
+    def element_invariants(self):
+        """
+        :return: for each id, (not the identity, not idempotent, size of the
+            row, size of the column, number of upper covers, number of lower
+            covers)
+        """
+        prod = self.prod
+        n = self.n
+        identity = [x for x in range(n)
+                    if all(prod[x][y] == y == prod[y][x] for y in range(n))]
+        return [(x not in identity,
+                 prod[x][x] != x,
+                 len(set(prod[x])),
+                 len(set(prod[y][x] for y in range(n))),
+                 len(self.covers[x]),
+                 len(self.lower[x]))
+                for x in range(n)]
+
+    def invariants(self):
+        """
+        :return: tuple of the number of elements, the number of idempotents,
+            and the sorted row sizes, column sizes, up degrees and down
+            degrees
+        """
+        values = self.element_invariants()
+        return (self.n,
+                sum(1 for v in values if not v[1]),
+                tuple(sorted(v[2] for v in values)),
+                tuple(sorted(v[3] for v in values)),
+                tuple(sorted(v[4] for v in values)),
+                tuple(sorted(v[5] for v in values)))
+
+    def refine(self, colours):
+        """
+        Refine a colouring until no two elements of one colour can be told
+        apart by the colours of their products, of the pairs multiplying to
+        them and of their covers.
+
+        :param colours: list of colours, numbered 0..k-1
+        :return: the stable colouring, numbered 0..m-1 in an order which only
+            depends on the colours
+        """
+        prod = self.prod
+        preimages = self.preimages
+        n = self.n
+        count = len(set(colours))
+        while True:
+            c = colours
+            signatures = [
+                (c[x],
+                 sorted((c[y], c[prod[x][y]], c[prod[y][x]])
+                        for y in range(n)),
+                 sorted((c[a], c[b]) for a, b in preimages[x]),
+                 sorted(c[y] for y in self.covers[x]),
+                 sorted(c[y] for y in self.lower[x]))
+                for x in range(n)]
+            colours = _relabel(signatures)
+            if len(set(colours)) == count:
+                return colours
+            count = len(set(colours))
+
+    def certificate(self, label):
+        """
+        :param label: list giving the canonical number of each id
+        :return: (number of elements, table in canonical numbers row after
+            row, sorted covering pairs in canonical numbers)
+        """
+        n = self.n
+        element = [0] * n
+        for x, i in enumerate(label):
+            element[i] = x
+        prod = self.prod
+        return (n,
+                tuple(label[prod[element[i]][element[j]]]
+                      for i in range(n) for j in range(n)),
+                tuple(sorted((label[x], label[y])
+                             for x in range(n) for y in self.covers[x])))
+
+
+def _relabel(keys):
+    """
+    :return: the rank of each key among the distinct keys
+    """
+    rank = dict((key, i) for i, key in enumerate(sorted(set(
+        _hashable(key) for key in keys))))
+    return [rank[_hashable(key)] for key in keys]
+
+
+def _hashable(key):
+    return tuple(tuple(part) if isinstance(part, list) else part
+                 for part in key) if isinstance(key, tuple) else key
+
+
+class _Search(object):
+    """
+    Individualisation and refinement, keeping the smallest certificate and
+    the automorphisms found as pairs of leaves with equal certificates.
+    """
+    def __init__(self, structure):
+        self.structure = structure
+        self.best = None
+        self.label = None
+        self.automorphisms = []
+
+    def run(self):
+        start = _relabel(self.structure.element_invariants())
+        self._visit(start, [])
+        return self.best, self.label
+
+    def _visit(self, colours, fixed):
+        colours = self.structure.refine(colours)
+        n = self.structure.n
+        cells = Counter(colours)
+        if len(cells) == n:
+            self._leaf(colours)
+            return
+        target = min(c for c, size in cells.items() if size > 1)
+        members = [x for x in range(n) if colours[x] == target]
+        explored = []
+        for x in members:
+            if self._equivalent(x, explored, fixed):
+                continue
+            explored.append(x)
+            child = _relabel([(colours[y], y != x) for y in range(n)])
+            self._visit(child, fixed + [x])
+
+    def _leaf(self, label):
+        certificate = self.structure.certificate(label)
+        if self.best is None or certificate < self.best:
+            self.best = certificate
+            self.label = label
+        elif certificate == self.best:
+            element = [0] * len(label)
+            for x, i in enumerate(self.label):
+                element[i] = x
+            self.automorphisms.append([element[i] for i in label])
+
+    def _equivalent(self, x, explored, fixed):
+        """
+        :return: True if an automorphism fixing the individualised elements
+            maps x to an element already explored at this node
+        """
+        if not explored:
+            return False
+        maps = [phi for phi in self.automorphisms
+                if all(phi[y] == y for y in fixed)]
+        if not maps:
+            return False
+        orbit = {x}
+        todo = [x]
+        while todo:
+            y = todo.pop()
+            for phi in maps:
+                z = phi[y]
+                if z not in orbit:
+                    orbit.add(z)
+                    todo.append(z)
+        return not orbit.isdisjoint(explored)
+
+
+def invariants(monoid):
+    """
+    :param monoid: Pomonoid
+    :return: tuple of invariants, equal for isomorphic pomonoids
+    """
+    return Structure(monoid).invariants()
+
+
+def canonical_form(monoid):
+    """
+    :param monoid: Pomonoid
+    :return: (certificate, labelling) where the certificate is equal for
+        isomorphic pomonoids only, and the labelling is a dict giving the
+        canonical number of each element
+    """
+    structure = Structure(monoid)
+    certificate, label = _Search(structure).run()
+    return certificate, dict(zip(structure.words, label))
+
+
+def canonical_hash(monoid):
+    """
+    :param monoid: Pomonoid
+    :return: hex digest of the canonical form, e.g. to deduplicate catalogues
+    """
+    certificate = canonical_form(monoid)[0]
+    return hashlib.sha1(repr(certificate).encode('utf-8')).hexdigest()
+
+
+def isomorphism(M, N):
+    """
+    :param M, N: Pomonoids
+    :return: dict mapping each element of M to its image in N under an
+        isomorphism, or None if they are not isomorphic
+    """
+    S = Structure(M)
+    T = Structure(N)
+    if S.invariants() != T.invariants():
+        return None
+    certificate, label = _Search(S).run()
+    other, other_label = _Search(T).run()
+    if certificate != other:
+        return None
+    element = dict((i, y) for y, i in zip(T.words, other_label))
+    return dict((x, element[i]) for x, i in zip(S.words, label))
+
+
+def is_isomorphic(M, N):
+    """
+    :param M, N: Pomonoids
+    :return: Boolean
+    """
+    return isomorphism(M, N) is not None
@@ -1,4 +1,17 @@
+from array import array
+
+from cayley import CayleyTable, gather
+from pomonoid import Pomonoid
+
+
 class MapSet(object):
+    """
+    A set of named maps on a finite set of ideals, generating a monoid of
+    transformations. The ideals are numbered once, in sorted order, and each
+    map is kept as an integer array over that numbering, so composing two
+    maps is a single gather. A word acts as the composition of its letters,
+    the rightmost letter being applied first.
+    """
     def __init__(self, **kwargs):
         for funcname, mapping in kwargs.items():
             setattr(self, funcname, mapping)
@@ -6,8 +19,131 @@ class MapSet(object):
         for mapping in kwargs.values():
             ideals = ideals.union(set(mapping.keys()))
             ideals = ideals.union(set(mapping.values()))
-        # identity = dict(('%s' % ideal:'%s' % ideal) for ideal in ideals)
-        # self.id = identity
+        self.ideals = sorted(ideals)
+        self.index = dict((ideal, i) for i, ideal in enumerate(self.ideals))
+        self.generators = sorted(kwargs)
+        self.maps = dict((name, self.encode(mapping))
+                         for name, mapping in kwargs.items())
+        self.identity = self._array(range(len(self.ideals)))
+
+    def _array(self, values):
+        # up to 256 ideals fit in bytes, which compose with bytes.translate
+        if len(self.ideals) <= 256:
+            return bytes(values)
+        return array('H', values)
+
+    def encode(self, mapping):
+        """
+        :param mapping: dict from ideals to ideals, defined on every ideal
+        :return: array of the image of each ideal, by number
+        """
+        missing = [ideal for ideal in self.ideals if ideal not in mapping]
+        if missing:
+            raise ValueError("map is not defined on %s" % missing[0])
+        return self._array(self.index[mapping[ideal]]
+                           for ideal in self.ideals)
+
+    def decode(self, values):
+        """
+        :param values: array of the image of each ideal, by number
+        :return: dict from ideals to ideals
+        """
+        return dict((ideal, self.ideals[values[i]])
+                    for i, ideal in enumerate(self.ideals))
+
+    def compose(self, a, b):
+        """
+        :param a, b: encoded maps
+        :return: encoded map of a after b
+        """
+        if isinstance(b, bytes):
+            return b.translate(a.ljust(256, b'\0'))
+        return array('H', gather(a, b))
+
+    def evaluate(self, word):
+        """
+        :param word: string of map names
+        :return: encoded map of the word
+        """
+        result = self.identity
+        for name in reversed(word):
+            result = self.compose(self.maps[name], result)
+        return result
+
+    def generate(self):
+        """
+        Breadth first enumeration of the monoid generated by the maps, with
+        duplicates detected on the array bytes. Each transformation is named
+        by its shortlex least word, the identity by '1'.
+
+        :return: (list of (word, map) pairs in order of discovery,
+                  right Cayley graph {word: {name: word}},
+                  set of relations (word, shorter equal word))
+        """
+        elements = [('1', self.identity)]
+        seen = {bytes(self.identity): '1'}
+        right_cayley = {}
+        relations = set()
+        for word, f in elements:
+            prefix = '' if word == '1' else word
+            row = {}
+            for name in self.generators:
+                g = self.compose(f, self.maps[name])
+                key = bytes(g)
+                found = seen.get(key)
+                if found is None:
+                    found = seen[key] = prefix + name
+                    elements.append((found, g))
+                elif found != prefix + name:
+                    relations.add((prefix + name, found))
+                row[name] = found
+            right_cayley[word] = row
+        return elements, right_cayley, relations
+
+    def orbits(self, maps=None):
+        """
+        :param maps: encoded maps, the whole generated monoid by default
+        :return: dict from each ideal to the set of its images
+        """
+        if maps is None:
+            maps = [f for _, f in self.generate()[0]]
+        # columns of the transformations, one per ideal
+        columns = zip(*maps)
+        return dict((ideal, set(map(self.ideals.__getitem__, column)))
+                    for ideal, column in zip(self.ideals, columns))
+
+    def k_numbers(self):
+        """
+        :return: (dict from each ideal to its k-number, the size of its
+                  orbit, and the K-number, the largest k-number)
+        """
+        k = dict((ideal, len(orbit))
+                 for ideal, orbit in self.orbits().items())
+        return k, max(k.values())
+
+    def to_pomonoid(self):
+        """
+        :return: the generated transformation monoid as an exported Pomonoid
+            with its Cayley table; words compose as the maps do
+        """
+        elements, right_cayley, relations = self.generate()
+        words = [word for word, _ in elements]
+        table = CayleyTable.from_cayley_graph(words, right_cayley)
+        generators = set(self.generators)
+        base_relations = {('11', '1')}
+        for name in generators:
+            base_relations.update({('1' + name, name), (name + '1', name)})
+        result = Pomonoid(relations=relations,
+                          override_table=table,
+                          override_elements=set(words),
+                          is_export=True,
+                          base_relations=base_relations,
+                          base_generators=generators)
+        result.operation.cayley_table = table
+        result.operation.generator_elements = right_cayley[words[0]]
+        result.normal_forms = words
+        return result
+
 
 field = MapSet(
     a = {
@@ -61,15 +197,16 @@ def compose(a, b):
     return dict((key, a[b[key]]) for key in b.keys())
 
 def multicompose(elt, mapset):
-    seq = list(elt)
-    seq = list(map(lambda x: getattr(mapset, x), seq))
-    cur = seq.pop(-1)
-    for item in reversed(seq):
-        cur = compose(item, cur)
-    return cur
-
-
-def find_orbits(mapset, elements):
-    allmaps = set(multicompose(elt, mapset) for elt in elements)
-    for ideal in mapset.r.keys():
-        print(set(f[ideal] for f in allmaps))
+    return mapset.decode(mapset.evaluate(elt))
+
+
+def find_orbits(mapset, elements=None):
+    """
+    Print the orbit of each ideal under the maps of the given words, or under
+    the whole generated monoid.
+    """
+    maps = None
+    if elements is not None:
+        maps = [mapset.evaluate(elt) for elt in elements]
+    for ideal, orbit in mapset.orbits(maps).items():
+        print(orbit)
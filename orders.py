@@ -0,0 +1,363 @@
+"""
+Exhaustive search for the partial orders on a finite monoid which are
+compatible with its multiplication: x <= y implies z*x <= z*y and
+x*z <= y*z for every z. Generators whose left multiplication reverses the
+order instead, like the annihilator in article_examples, can be named as
+antitone, in which case x <= y implies g*y <= g*x for those g.
+
+The search decides one pair (x, y) at a time, first adding x <= y and then
+forbidding it. Adding a pair takes the least compatible order containing it:
+the relation is kept transitively closed as bitset rows of up-sets and
+down-sets, and every new pair is multiplied on both sides by each generator
+through the Cayley table, which is enough since the generators generate.
+A branch is cut as soon as this creates a cycle or a forbidden pair.
+
+Automorphisms of the monoid act on the orders, and only the order whose
+relation, read as a bit vector in the order the pairs are decided, is the
+largest of its orbit is kept. Branches whose decided pairs already show an
+automorphism making the relation larger are cut.
+
+Each order is yielded as soon as it is found, as the set of its covering
+pairs (x, y) with x < y, ready for Pomonoid.attach_order(ordering=...).
+"""
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import bitsets
+
+# Number of search tree nodes handed out per worker
+NODES_PER_WORKER = 8
+
+# Per-process search installed by the pool initializer
+_state = {}
+
+
+def automorphisms(table, generators, identity=0):
+    """
+    An automorphism is determined by the images of the generators: every
+    other element is its parent in the breadth first spanning tree times a
+    generator. Each choice of images is extended along the tree and kept if
+    it is a bijection respecting right multiplication by the generators.
+
+    :param table: CayleyTable of the monoid
+    :param generators: ids of the generators in table
+    :param identity: id of the identity
+    :return: list of automorphisms as lists of ids, the identity map first
+    """
+    n = table.size
+    right = [table.column(g) for g in generators]
+    tree = []
+    seen = {identity}
+    frontier = [identity]
+    while frontier:
+        next_frontier = []
+        for x in frontier:
+            for k, column in enumerate(right):
+                y = column[x]
+                if y not in seen:
+                    seen.add(y)
+                    tree.append((y, x, k))
+                    next_frontier.append(y)
+        frontier = next_frontier
+    if len(seen) < n:
+        raise ValueError("the generators do not generate the table")
+
+    result = []
+    for images in itertools.product(range(n), repeat=len(generators)):
+        phi = [None] * n
+        phi[identity] = identity
+        for y, x, k in tree:
+            phi[y] = table.prod_id(phi[x], images[k])
+        if len(set(phi)) < n:
+            continue
+        if all(phi[column[x]] == table.prod_id(phi[x], images[k])
+               for k, column in enumerate(right) for x in range(n)):
+            result.append(phi)
+    result.sort(key=lambda phi: phi != list(range(n)))
+    return result
+
+
+class OrderSearch(object):
+    """
+    The search over the orders of a monoid given by its Cayley table. States
+    are tuples (up, down, excluded) of bitset rows: y is in up[x] and x in
+    down[y] when x < y, and y is in excluded[x] when x <= y is forbidden.
+
+    :param table: CayleyTable of the monoid
+    :param generators: ids of the generators in table
+    :param antitone: ids among generators whose left multiplication reverses
+        the order
+    :param identity: id of the identity
+    :param symmetry: whether to keep one order per automorphism orbit
+    """
+    def __init__(self, table, generators, antitone=(), identity=0,
+                 symmetry=True):
+        n = self.n = table.size
+        self.right = [list(table.column(g)) for g in generators]
+        self.left = [[table.prod_id(g, x) for x in range(n)]
+                     for g in generators]
+        self.flip = [g in antitone for g in generators]
+        self.pairs = [(x, y) for x in range(n) for y in range(n) if x != y]
+        self.inverses = []
+        if symmetry:
+            maps = automorphisms(table, generators, identity)[1:]
+            if antitone:
+                # only maps permuting the generators and keeping the antitone
+                # ones apart are sure to send compatible orders to such
+                maps = [phi for phi in maps
+                        if sorted(phi[g] for g in generators)
+                        == sorted(generators)
+                        and all((phi[g] in antitone) == (g in antitone)
+                                for g in generators)]
+            self.inverses = [self._inverse(phi) for phi in maps]
+
+    @staticmethod
+    def _inverse(phi):
+        result = [0] * len(phi)
+        for x, y in enumerate(phi):
+            result[y] = x
+        return result
+
+    def restrict(self, forced, forbidden):
+        """
+        Keep only the automorphisms preserving the forced and forbidden pairs.
+
+        :param forced, forbidden: sets of pairs of ids
+        """
+        self.inverses = [
+            inverse for inverse in self.inverses
+            if all(set((inverse[x], inverse[y]) for x, y in pairs) == pairs
+                   for pairs in (forced, forbidden))]
+
+    def root(self, forced=(), forbidden=()):
+        """
+        :return: the state with the forced pairs added and the forbidden ones
+            excluded, or None if they are inconsistent
+        """
+        n = self.n
+        state = ([0] * n, [0] * n, [0] * n)
+        for x, y in forbidden:
+            if x == y:
+                return None
+            state[2][x] |= 1 << y
+        for x, y in forced:
+            state = self.add(state, x, y)
+            if state is None:
+                return None
+        return state
+
+    def add(self, state, x, y):
+        """
+        :return: the state with the least compatible order containing x <= y
+            and the order of state, or None if there is none avoiding the
+            excluded pairs
+        """
+        up, down, excluded = state
+        up = list(up)
+        down = list(down)
+        right, left, flip = self.right, self.left, self.flip
+        todo = [(x, y)]
+        while todo:
+            a, b = todo.pop()
+            if a == b or up[a] >> b & 1:
+                continue
+            lower = down[a] | 1 << a
+            upper = up[b] | 1 << b
+            if lower & upper:
+                return None
+            for c in bitsets.bits(lower):
+                new = upper & ~up[c]
+                if not new:
+                    continue
+                if new & excluded[c]:
+                    return None
+                up[c] |= new
+                for d in bitsets.bits(new):
+                    down[d] |= 1 << c
+                    for column in right:
+                        todo.append((column[c], column[d]))
+                    for row, reverse in zip(left, flip):
+                        if reverse:
+                            todo.append((row[d], row[c]))
+                        else:
+                            todo.append((row[c], row[d]))
+        return up, down, excluded
+
+    @staticmethod
+    def exclude(state, x, y):
+        """
+        :return: the state with x <= y forbidden
+        """
+        excluded = list(state[2])
+        excluded[x] |= 1 << y
+        return state[0], state[1], excluded
+
+    @staticmethod
+    def _value(state, x, y):
+        """
+        :return: 1 if x < y, 0 if that is ruled out, None if undecided
+        """
+        up, down, excluded = state
+        if up[x] >> y & 1:
+            return 1
+        if excluded[x] >> y & 1 or up[y] >> x & 1:
+            return 0
+        return None
+
+    def _dominated(self, state):
+        """
+        Lex-leader test: compare the relation with its image under each
+        automorphism pair by pair, as long as both are decided.
+
+        :return: True if some image is certainly larger
+        """
+        value = self._value
+        for inverse in self.inverses:
+            for x, y in self.pairs:
+                mine = value(state, x, y)
+                if mine is None:
+                    break
+                image = value(state, inverse[x], inverse[y])
+                if image is None:
+                    break
+                if mine != image:
+                    if image > mine:
+                        return True
+                    break
+        return False
+
+    def _next(self, state, k):
+        """
+        :return: index of the first undecided pair from k on, or None
+        """
+        pairs = self.pairs
+        value = self._value
+        while k < len(pairs):
+            x, y = pairs[k]
+            if value(state, x, y) is None:
+                return k
+            k += 1
+        return None
+
+    def children(self, state, k):
+        """
+        :return: the states below a search tree node, the branch adding the
+            k-th pair first
+        """
+        x, y = self.pairs[k]
+        result = []
+        included = self.add(state, x, y)
+        if included is not None:
+            result.append(included)
+        result.append(self.exclude(state, x, y))
+        return result
+
+    def search(self, state, k=0):
+        """
+        Depth first search below a state.
+
+        :param k: index of the first pair which may be undecided
+        :return: generator of the up rows of the orders found
+        """
+        stack = [(state, k)]
+        while stack:
+            state, k = stack.pop()
+            if self._dominated(state):
+                continue
+            k = self._next(state, k)
+            if k is None:
+                yield state[0]
+                continue
+            stack.extend((child, k + 1)
+                         for child in reversed(self.children(state, k)))
+
+    def split(self, state, count):
+        """
+        Expand the search tree breadth first, keeping the depth first order
+        of the nodes, until there are at least count of them.
+
+        :return: list of (state, k) nodes
+        """
+        nodes = [(state, 0)]
+        while len(nodes) < count:
+            expanded = []
+            grown = False
+            for state, k in nodes:
+                if self._dominated(state):
+                    grown = True
+                    continue
+                k = self._next(state, k)
+                if k is None:
+                    expanded.append((state, len(self.pairs)))
+                    continue
+                grown = True
+                expanded.extend((child, k + 1)
+                                for child in self.children(state, k))
+            nodes = expanded
+            if not grown:
+                break
+        return nodes
+
+
+def _init_search(search):
+    _state['search'] = search
+
+
+def _search_node(node):
+    """
+    :param node: (state, k) search tree node
+    :return: list of the up rows of the orders below the node
+    """
+    return list(_state['search'].search(*node))
+
+
+def compatible_orders(monoid, forced=(), forbidden=(), antitone=(),
+                      symmetry=True, workers=None):
+    """
+    Yield the partial orders on the elements of monoid compatible with its
+    multiplication, as sets of covering pairs (x, y) with x < y. With
+    workers, subtrees of the search are handed to a process pool and their
+    orders come back in the same order as the serial search.
+
+    :param monoid: Pomonoid, which need not have an order
+    :param forced: pairs (x, y) of elements with x <= y in every order
+    :param forbidden: pairs (x, y) of elements with x <= y in none
+    :param antitone: generators whose left multiplication reverses the order
+    :param symmetry: whether to yield only one order per orbit under the
+        automorphisms of monoid preserving forced, forbidden and antitone
+    :param workers: number of processes, None to search in this process
+    """
+    operation = monoid.operation
+    table = operation.id_table()
+    ids = table.ids
+    generators = [ids[operation.evaluate(g)]
+                  for g in operation.ordered_generators]
+    generators = sorted(set(generators), key=generators.index)
+    antitone = set(ids[operation.evaluate(g)] for g in antitone)
+    forced = set((ids[x], ids[y]) for x, y in forced)
+    forbidden = set((ids[x], ids[y]) for x, y in forbidden)
+    search = OrderSearch(table, generators, antitone=antitone,
+                         identity=ids[operation.evaluate('')],
+                         symmetry=symmetry)
+    search.restrict(forced, forbidden)
+    state = search.root(forced, forbidden)
+    if state is None:
+        return
+
+    words = table.words
+
+    def covers(up):
+        return set((words[x], words[y])
+                   for x, row in enumerate(bitsets.reduction(up))
+                   for y in bitsets.bits(row))
+
+    if not workers:
+        for up in search.search(state):
+            yield covers(up)
+        return
+    nodes = search.split(state, NODES_PER_WORKER * workers)
+    with ProcessPoolExecutor(workers, initializer=_init_search,
+                             initargs=(search,)) as pool:
+        for found in pool.map(_search_node, nodes):
+            for up in found:
+                yield covers(up)
@@ -0,0 +1,141 @@
+"""
+Process pool versions of element enumeration and table construction, used
+when a Pomonoid is given workers=N. Results come back from the workers as
+joined strings or packed id arrays rather than pickled dicts, and are merged
+in the same order as the serial code, so the outcome is identical.
+"""
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from cayley import CayleyTable, spanning_tree, typecode
+
+# Work smaller than this is done in the main process
+MIN_PARALLEL = 256
+
+# Per-process state installed by the pool initializers
+_state = {}
+
+
+def _chunks(n, workers):
+    """
+    :return: list of (start, end) ranges splitting range(n) into a few
+        pieces per worker
+    """
+    count = max(1, min(n, 4 * workers))
+    size = -(-n // count)
+    return [(i, min(i + size, n)) for i in range(0, n, size)]
+
+
+def _init_reduce(system, generators):
+    _state['system'] = system
+    _state['generators'] = generators
+
+
+def _reduce_chunk(prefixes):
+    """
+    :param prefixes: normal forms ('' for the identity) joined by newlines
+    :return: the normal forms of prefix + g for each prefix and generator,
+        joined by newlines
+    """
+    reduce = _state['system'].reduce
+    generators = _state['generators']
+    return '\n'.join(reduce(prefix + g)
+                     for prefix in prefixes.split('\n')
+                     for g in generators)
+
+
+def enumerate_elements(operation, max_length=None, workers=2):
+    """
+    Breadth first enumeration as in Pomonoid.iter_elements, one level at a
+    time, with the products of each level split by prefix over the pool.
+
+    :param operation: Operation of the monoid
+    :param max_length: longest word (in generators) to multiply out
+    :param workers: number of processes
+    :return: (normal forms in shortlex order, right Cayley graph)
+    """
+    system = operation.rewriting_system
+    generators = operation.ordered_generators
+    normal_forms = ['1']
+    seen = {'1'}
+    right_cayley = {}
+    frontier = ['1']
+    depth = 0
+    with ProcessPoolExecutor(workers, initializer=_init_reduce,
+                             initargs=(system, generators)) as pool:
+        while frontier and (max_length is None or depth < max_length):
+            prefixes = ['' if x == '1' else x for x in frontier]
+            if len(frontier) < MIN_PARALLEL:
+                products = [system.reduce(prefix + g)
+                            for prefix in prefixes for g in generators]
+            else:
+                jobs = ['\n'.join(prefixes[start:end])
+                        for start, end in _chunks(len(prefixes), workers)]
+                products = []
+                for result in pool.map(_reduce_chunk, jobs):
+                    products.extend(result.split('\n'))
+            products = iter(products)
+            next_frontier = []
+            for x in frontier:
+                row = {}
+                for g in generators:
+                    y = next(products)
+                    row[g] = y
+                    if y not in seen:
+                        seen.add(y)
+                        normal_forms.append(y)
+                        next_frontier.append(y)
+                right_cayley[x] = row
+            frontier = next_frontier
+            depth += 1
+    return normal_forms, right_cayley
+
+
+def _init_table(right, tree, code):
+    _state['right'] = right
+    _state['tree'] = tree
+    _state['code'] = code
+
+
+def _table_rows(bounds):
+    """
+    :param bounds: (start, end) range of element ids
+    :return: bytes of the table rows start..end-1, row after row
+    """
+    right = _state['right']
+    tree = _state['tree']
+    result = array(_state['code'])
+    row = [0] * len(tree)
+    for i in range(*bounds):
+        row[0] = i
+        for j, parent, g in tree[1:]:
+            row[j] = right[g][row[parent]]
+        result.extend(row)
+    return result.tobytes()
+
+
+def cayley_table(words, right_cayley, backend='array', workers=2):
+    """
+    Build the CayleyTable of CayleyTable.from_cayley_graph with the rows
+    split by element id ranges over the pool. Each row is composed along the
+    spanning tree independently of the others.
+
+    :param words: list of elements, starting with the identity
+    :param right_cayley: dict {x: {g: x*g}} covering every element
+    :param backend: 'array' or 'numpy'
+    :param workers: number of processes
+    """
+    n = len(words)
+    if n < MIN_PARALLEL:
+        return CayleyTable.from_cayley_graph(words, right_cayley,
+                                             backend=backend)
+    right, tree = spanning_tree(words, right_cayley)
+    code = typecode(n)
+    right = dict((g, array(code, ids)) for g, ids in right.items())
+    data = array(code)
+    with ProcessPoolExecutor(workers, initializer=_init_table,
+                             initargs=(right, tree, code)) as pool:
+        for rows in pool.map(_table_rows, _chunks(n, workers)):
+            data.frombytes(rows)
+    columns = [data[j::n] for j in range(n)]
+    return CayleyTable(words, columns, backend=backend)
@@ -1,6 +1,17 @@
-import copy
 import itertools
-from collections import namedtuple
+from array import array
+from collections import OrderedDict, namedtuple
+from collections.abc import Mapping, MutableMapping
+
+import axioms
+import bitsets
+import congruence
+import green
+import hasse
+import instrumentation
+import parallel
+from cayley import CayleyTable, spanning_tree, typecode
+from rewriting import RewritingSystem, alphabet_order, shortlex_key
 
 # Constants which can be overridden to study different partially ordered monoids
 BASE_GENERATORS = {'a', 'r'}
@@ -8,32 +19,95 @@ BASE_RELATIONS = {('aaa', 'a'), ('rr', 'r'), ('11', '1'),
                   ('1a', 'a'), ('a1', 'a'),
                   ('1r', 'r'), ('r1', 'r')}
 
+
+def identity_relations(generators):
+    """
+    :param generators: set of generators
+    :return: set of the relations making '1' the identity, and no others
+    """
+    relations = {('11', '1')}
+    for g in generators:
+        relations.add(('1' + g, g))
+        relations.add((g + '1', g))
+    return relations
+
+
 # Base classes
 class Operation(object):
     """
     An Operation object encapsulates the monoid's operation and reduction rules.
+    Given an instrumentation.Stats as stats, it counts reduce calls and the
+    rewrite steps of each rule, and times table generation.
+
+    Once there is a table, words can also be evaluated on it without
+    rewriting. An Operation given an override table (an export) reduces
+    words that way, since its relations need not present the monoid.
+    generator_elements, when set, gives the element of each generator.
     """
 
     def __init__(self, relations=set(), override_table=dict(),
-        base_generators=BASE_GENERATORS, base_relations=BASE_RELATIONS):
+        base_generators=BASE_GENERATORS, base_relations=BASE_RELATIONS,
+        stats=None):
         self.generators = base_generators
         self.table = override_table
+        self.cayley_table = None
         self.relations = base_relations.union(relations)
+        self.stats = stats
+        self.table_driven = bool(override_table)
+        self.generator_elements = None
+
+    @property
+    def rewriting_system(self):
+        """
+        The confluent rewriting system completed from the relations. It is
+        built on first use and rebuilt if relations have been added or the
+        set replaced since; relations are never removed, so the identity and
+        size of the set tell, without hashing every relation on each call.
+        Operations with identical presentations share one system, and with it
+        the cache of normal forms.
+        """
+        relations = self.relations
+        if (getattr(self, '_completed_relations', None) is not relations
+                or self._completed_size != len(relations)):
+            self._rewriting_system = RewritingSystem.shared(
+                relations, letters=self.generators)
+            self._completed_relations = relations
+            self._completed_size = len(relations)
+        return self._rewriting_system
+
+    @property
+    def ordered_generators(self):
+        """
+        The generators, listed in the letter order used for normal forms.
+        A table-driven operation never rewrites, so the order is read off
+        its relations as the rewriting system would, without completing
+        them.
+        """
+        if self.table_driven:
+            letters = set(self.generators).union(
+                ''.join(x + y for x, y in self.relations))
+            alphabet = alphabet_order(letters, self.relations)
+        else:
+            alphabet = self.rewriting_system.alphabet
+        return [c for c in alphabet if c in self.generators]
 
     def reduce(self, word):
         """
         :param word: word (string) to be reduced
         :return: reduced word (string) according to relations
         """
-        # print(self.relations)
-        orig = copy.copy(word)
-        for x, y in self.relations:
-            if x in word:
-                word = word.replace(x, y)
-        if word == orig:
-            return word
-        else:
-            return self.reduce(word)
+        if self.table_driven:
+            return self.evaluate(word)
+        if self.stats is None:
+            return self.rewriting_system.reduce(word)
+        self.stats.count('reduce')
+        return self.rewriting_system.reduce(word, self.stats.rewrites)
+
+    def cache_info(self):
+        """
+        :return: CacheInfo statistics of the shared normal form cache
+        """
+        return self.rewriting_system.cache.info()
 
     def prod(self, x, y):
         """
@@ -45,40 +119,332 @@ class Operation(object):
         """
         return self.reduce(x + y)
 
-    def _generate_table(self, elements):
+    def prod_id(self, i, j):
+        """
+        :param i, j: element ids in cayley_table
+        :return: id of the product
+        """
+        return self.cayley_table.prod_id(i, j)
+
+    def id_table(self):
+        """
+        :return: cayley_table, numbering the elements of a dict-of-dicts
+            table (such as that of an export) first if there is none
+        """
+        if self.cayley_table is None:
+            self.cayley_table = CayleyTable.from_dict(self.table)
+        return self.cayley_table
+
+    def _evaluator(self):
+        """
+        :return: (id table, id of '1', dict from each generator to the column
+            of ids of x*g), computed once per table
+        """
+        table = self.id_table()
+        cached = getattr(self, '_evaluation', None)
+        if cached is not None and cached[0] is table:
+            return cached
+        names = dict((str(e), i) for i, e in enumerate(table.words))
+        columns = {}
+        for g in self.generators:
+            if self.generator_elements is not None:
+                element = self.generator_elements[g]
+            elif g in names:
+                element = g
+            else:
+                element = self.rewriting_system.reduce(g)
+            columns[g] = table.column(names[str(element)])
+        self._evaluation = (table, names['1'], columns)
+        return self._evaluation
+
+    def evaluate(self, word):
+        """
+        Evaluate a word on the table, following the column of each of its
+        letters from the identity, in O(len(word)) lookups and without
+        rewriting.
+
+        :param word: word (string) in the generators and '1'
+        :return: the element the word evaluates to
+        """
+        table, i, columns = self._evaluator()
+        try:
+            for c in word:
+                if c != '1':
+                    i = columns[c][i]
+        except KeyError as e:
+            raise ValueError("%r is not a generator" % e.args[0])
+        return table.words[i]
+
+    def evaluate_many(self, words, use_numpy=None):
+        """
+        Evaluate a batch of words. With NumPy the words are padded with '1'
+        into a matrix of letter codes and all of them advance one letter at
+        a time through a matrix of generator columns.
+
+        :param words: iterable of words
+        :param use_numpy: force or avoid NumPy, by default used if available
+        :return: list of the elements the words evaluate to
         """
-        :param elements: set of elements of the Monoid
+        words = list(words)
+        if use_numpy is None:
+            try:
+                import numpy
+                use_numpy = True
+            except ImportError:
+                use_numpy = False
+        if not use_numpy or not words:
+            return [self.evaluate(word) for word in words]
+
+        import numpy as np
+        table, identity, columns = self._evaluator()
+        letters = sorted(columns)
+        # row 0 is the identity, row k + 1 the column of letters[k]
+        steps = np.empty((len(letters) + 1, table.size), dtype=np.intp)
+        steps[0] = np.arange(table.size)
+        for k, g in enumerate(letters):
+            steps[k + 1] = columns[g]
+        codes = np.full(256, -1, dtype=np.intp)
+        codes[ord('1')] = 0
+        for k, g in enumerate(letters):
+            codes[ord(g)] = k + 1
+
+        length = max(len(word) for word in words)
+        try:
+            text = ''.join(word.ljust(length, '1')
+                           for word in words).encode('latin-1')
+        except UnicodeEncodeError:
+            return [self.evaluate(word) for word in words]
+        matrix = codes[np.frombuffer(text, dtype=np.uint8)]
+        if (matrix < 0).any():
+            bad = text[int(np.argmax(matrix < 0))]
+            raise ValueError("%r is not a generator" % chr(bad))
+        matrix = matrix.reshape(len(words), length)
+        state = np.full(len(words), identity, dtype=np.intp)
+        for t in range(length):
+            state = steps[matrix[:, t], state]
+        return [table.words[i] for i in state]
+
+    def _generate_table(self, elements, right_cayley=None, backend='dict',
+                        workers=None):
+        """
+        When the right Cayley graph covers every element, the table is
+        composed from it with integer lookups instead of reducing all n^2
+        products, and the elements are numbered in the given order. With
+        workers, the rows are composed in that many processes.
+
+        :param elements: elements of the Monoid, identity first when
+            right_cayley is given
+        :param right_cayley: optional dict {x: {g: x*g}}
+        :param backend: 'dict' for a dict-of-dicts table keyed by words,
+            'array' or 'numpy' for a compact CayleyTable over element ids
+        :param workers: optional number of processes
         :return: None (table is established in Operation object)
         """
+        with instrumentation.phase(self.stats, 'table'):
+            self._compose_table(list(elements), right_cayley, backend,
+                                workers)
+
+    def _compose_table(self, elements, right_cayley, backend, workers):
+        if right_cayley is not None and \
+                all(x in right_cayley for x in elements):
+            table_backend = 'array' if backend == 'dict' else backend
+            if workers:
+                self.cayley_table = parallel.cayley_table(
+                    elements, right_cayley, backend=table_backend,
+                    workers=workers)
+            else:
+                self.cayley_table = CayleyTable.from_cayley_graph(
+                    elements, right_cayley, backend=table_backend)
+            if backend == 'dict':
+                self.table = self.cayley_table.as_dict()
+            else:
+                self.table = self.cayley_table
+            return
+
         self.table = dict((x, dict((y, self.prod(x, y))
                           for y in elements))
                           for x in elements)
+        try:
+            self.cayley_table = CayleyTable.from_dict(
+                self.table, elements,
+                backend='array' if backend == 'dict' else backend)
+        except ValueError:
+            # a truncated enumeration is not closed under the product
+            if backend != 'dict':
+                raise
+            self.cayley_table = None
+        if backend != 'dict':
+            self.table = self.cayley_table
+
+
+class _RelationRow(MutableMapping):
+    """
+    One row of a RelationView: the elements related to x.
+    """
+    def __init__(self, view, x):
+        self._view = view
+        self._x = x
+
+    def __getitem__(self, y):
+        return self._view.contains(self._x, y)
+
+    def __setitem__(self, y, value):
+        self._view.set(self._x, y, value)
+
+    def __delitem__(self, y):
+        raise TypeError("relation rows cover every element")
+
+    def __iter__(self):
+        return iter(self._view.elements)
+
+    def __len__(self):
+        return len(self._view.elements)
+
+
+class RelationView(Mapping):
+    """
+    Read the relation as view[x][y], like a dict-of-dicts of booleans over
+    the elements, without materialising it. The relation is either given by
+    bitset rows over the numbered elements, in which case entries can also be
+    assigned, or by a predicate evaluated on demand. Read-only rows, such as
+    the bitsets.PackedRows of a loaded model, are copied into a list on the
+    first assignment.
+
+    :param elements: list of elements, numbered by position
+    :param rows: optional list of bitsets, bit j of rows[i] for (i, j)
+    :param predicate: optional function (x, y) -> bool
+    :param index: optional dict numbering the elements, shared if given
+    :param on_change: optional function called after an assignment
+    """
+    def __init__(self, elements, rows=None, predicate=None, index=None,
+                 on_change=None):
+        self.elements = elements
+        if index is None:
+            index = dict((e, i) for i, e in enumerate(elements))
+        self.index = index
+        self.rows = rows
+        self.predicate = predicate
+        self.on_change = on_change
+
+    def contains(self, x, y):
+        if self.rows is None:
+            return self.predicate(x, y)
+        return bool(self.rows[self.index[x]] >> self.index[y] & 1)
+
+    def set(self, x, y, value):
+        if self.rows is None:
+            raise TypeError("relation is computed on demand")
+        if not isinstance(self.rows, list):
+            self.rows = list(self.rows)
+        i = self.index[x]
+        if value:
+            self.rows[i] |= 1 << self.index[y]
+        else:
+            self.rows[i] &= ~(1 << self.index[y])
+        if self.on_change is not None:
+            self.on_change()
+
+    def __getitem__(self, x):
+        if x not in self.index:
+            raise KeyError(x)
+        return _RelationRow(self, x)
+
+    def __iter__(self):
+        return iter(self.elements)
+
+    def __len__(self):
+        return len(self.elements)
 
 
 class Order(object):
     """
     An Order object carries partial ordering information about a monoid.
+
+    Internally each element is numbered and its strict up-set (up) and
+    covers (covers) are kept as bitsets; ordering and incidence are
+    dict-of-dicts views of the transitive closure and the Hasse diagram,
+    read and assigned through the bitsets. Up-sets, down-sets, intervals,
+    joins and meets are answered by a bitsets.Poset over the rows.
+    Given an instrumentation.Stats as stats, closure and reduction are timed
+    and their row unions counted.
     """
     def __init__(self, order_relations=set(), elements=set(),
                  override_ordering=dict(),
-                 override_incidence=dict()):
+                 override_incidence=dict(),
+                 stats=None):
+        self.stats = stats
         if not override_ordering:
             self.pairs = order_relations
             self.elements = elements
-            self.ordering = dict((e, dict((f, False) for f in self.elements))
-                                 for e in self.elements)
-            self.incidence = dict((e, dict((f, False) for f in self.elements))
-                                  for e in self.elements)
-
+            self._number(self.elements)
+            self.direct = [0] * len(self._elements)
             for x, y in self.pairs:
-                self.ordering[x][y] = True
-                self.incidence[x][y] = True
+                self.direct[self._index[x]] |= 1 << self._index[y]
 
-            self._minify()
             self._maxify()
+            self._minify()
         else:
-            self.ordering = override_ordering
-            self.incidence = override_incidence
+            self.elements = set(override_ordering)
+            self._number(self.elements)
+            self.up = self._from_dict(override_ordering)
+            self.covers = self._from_dict(override_incidence)
+        self._views()
+
+    @classmethod
+    def from_rows(cls, elements, up, covers):
+        """
+        Build an Order from bitsets that are already computed.
+
+        :param elements: list of elements, numbered by position
+        :param up: bitsets of the strict up-sets (the ordering)
+        :param covers: bitsets of the covers (the incidence)
+        """
+        order = cls.__new__(cls)
+        order.stats = None
+        order.elements = set(elements)
+        order._number(elements)
+        order.up = up
+        order.covers = covers
+        order._views()
+        return order
+
+    def _number(self, elements):
+        self._elements = list(elements)
+        self._index = dict((e, i) for i, e in enumerate(self._elements))
+
+    def _views(self):
+        self.ordering = RelationView(self._elements, rows=self.up,
+                                     index=self._index,
+                                     on_change=self._ordering_changed)
+        self.incidence = RelationView(self._elements, rows=self.covers,
+                                      index=self._index,
+                                      on_change=self._incidence_changed)
+
+    def _ordering_changed(self):
+        # the view may have replaced read-only rows by a copy
+        self.up = self.ordering.rows
+        self._poset = None
+
+    def _incidence_changed(self):
+        self.covers = self.incidence.rows
+
+    @property
+    def poset(self):
+        """
+        :return: bitsets.Poset over the current up rows
+        """
+        poset = getattr(self, '_poset', None)
+        if poset is None or poset.up is not self.up:
+            poset = self._poset = bitsets.Poset(self.up)
+        return poset
+
+    def _from_dict(self, relation):
+        rows = [0] * len(self._elements)
+        for e in relation:
+            for f in relation[e]:
+                if relation[e][f]:
+                    rows[self._index[e]] |= 1 << self._index[f]
+        return rows
 
     def incidence_sum(self):
         c = 0
@@ -88,39 +454,26 @@ class Order(object):
         return c
 
     def _minify(self):
-        i = 0
-        while i < 10000:
-            count1 = self.incidence_sum()
-            for a, b, c in itertools.product(self.elements,
-                                             self.elements,
-                                             self.elements):
-                if len({a, b, c}) < 3:
-                    pass
-                if self.incidence[a][b] and self.incidence[b][c]:
-                    self.incidence[a][c] = False
-            count2 = self.incidence_sum()
-            if count2 == count1:
-                break
-            i += 1
-        return self.incidence
+        """
+        Exact transitive reduction of the ordering: the Hasse covers.
+        """
+        stats = self.stats
+        with instrumentation.phase(stats, 'reduction'):
+            self.covers = bitsets.reduction(
+                self.up, self.direct,
+                counts=None if stats is None else stats.counters)
+        return self.covers
 
     def _maxify(self):
-        i = 0
-        while i < 10000:
-            count1 = self.incidence_sum()
-            for a, b, c in itertools.product(self.elements,
-                                             self.elements,
-                                             self.elements):
-                if len({a, b, c}) < 3:
-                    pass
-                if self.ordering[a][b] and self.ordering[b][c]:
-                    self.ordering[a][c] = True
-            count2 = self.incidence_sum()
-            if count2 == count1:
-                break
-            else:
-                i += 1
-        return self.ordering
+        """
+        Transitive closure of the given pairs.
+        """
+        stats = self.stats
+        with instrumentation.phase(stats, 'closure'):
+            self.up = bitsets.closure(
+                self.direct,
+                counts=None if stats is None else stats.counters)
+        return self.up
 
     def compare(self, x, y):
         """
@@ -129,7 +482,52 @@ class Order(object):
         :param x, y: elements
         :return: Boolean
         """
-        return (self.ordering[x][y] is True) or (x == y)
+        return x == y or bool(self.up[self._index[x]] >> self._index[y] & 1)
+
+    def upper_covers(self, x):
+        """
+        :param x: element
+        :return: list of the elements covering x in the Hasse diagram
+        """
+        return [self._elements[j]
+                for j in bitsets.bits(self.covers[self._index[x]])]
+
+    def _members(self, mask):
+        return [self._elements[j] for j in bitsets.bits(mask)]
+
+    def _element(self, i):
+        return None if i is None else self._elements[i]
+
+    def up_set(self, x):
+        """
+        :return: list of x and the elements above it
+        """
+        return self._members(self.poset.up_set(self._index[x]))
+
+    def down_set(self, x):
+        """
+        :return: list of x and the elements below it
+        """
+        return self._members(self.poset.down_set(self._index[x]))
+
+    def interval(self, x, y):
+        """
+        :return: list of the elements between x and y, both included
+        """
+        return self._members(self.poset.interval(self._index[x],
+                                                 self._index[y]))
+
+    def join(self, x, y):
+        """
+        :return: the least element above x and y, or None
+        """
+        return self._element(self.poset.join(self._index[x], self._index[y]))
+
+    def meet(self, x, y):
+        """
+        :return: the greatest element below x and y, or None
+        """
+        return self._element(self.poset.meet(self._index[x], self._index[y]))
 
     def report_incidence(self):
         for k in self.incidence:
@@ -144,11 +542,19 @@ class ProductElement(object):
     A ProductElement represents an element of the Cartesian product of monoids.
     Since the originally generated sequence may reduce beyond recognition in
     the component monoids, it is retained as the `original` attribute.
+
+    Elements are equal, and hash alike, when their components are equal. The
+    hash is computed once. Elements of a ProductPomonoid also carry their id,
+    the position in normal_forms and the numbering of its table and order.
     """
-    def __init__(self, original, left, right):
+    __slots__ = ('original', 'left', 'right', 'id', '_hash')
+
+    def __init__(self, original, left, right, id=None):
         self.original = original
         self.left = left
         self.right = right
+        self.id = id
+        self._hash = hash((left, right))
 
     @property
     def pair(self):
@@ -158,66 +564,114 @@ class ProductElement(object):
         return str(self.original)
 
     def __repr__(self):
-        """
-        Make it hashable so it can be used for keys in the tables.
-        """
         return str((self.original, self.left, self.right))
 
     def __hash__(self):
-        return hash(self.__repr__())
+        return self._hash
 
     def __eq__(self, other):
+        if not isinstance(other, ProductElement):
+            return NotImplemented
         return self.left == other.left and self.right == other.right
 
+    def __ne__(self, other):
+        if not isinstance(other, ProductElement):
+            return NotImplemented
+        return self.left != other.left or self.right != other.right
+
+    def __getstate__(self):
+        return (self.original, self.left, self.right, self.id)
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
 
 class ProductOrder(Order):
     """
     The product order determines that one tuple is <= another tuple
     iff corresponding entries are <= in their respective pomonoids.
+
+    Elements are numbered in the order given, which for a ProductPomonoid is
+    the order of their ids. The strict up-sets are bitsets over those
+    numbers, each the AND of two masks computed once per component element.
+    The Hasse diagram is built from the component Hasse diagrams.
     """
-    def __init__(self, M, N, elements):
+    def __init__(self, M, N, elements, stats=None):
         self.order1 = M.order
         self.order2 = N.order
-        self.elements = elements
-        self.ordering = dict((e, dict((f, False) for f in self.elements))
-                             for e in self.elements)
-        self._maxify()
-        self.incidence = copy.deepcopy(self.ordering)
-        self._minify()
+        self.stats = stats
+        self._number(elements)
+        self.elements = set(self._elements)
+        with instrumentation.phase(stats, 'closure'):
+            self._maxify()
+        with instrumentation.phase(stats, 'reduction'):
+            self._minify()
+        self._views()
 
     def compare(self, x, y):
         return self.order1.compare(x.left, y.left) and \
             self.order2.compare(x.right, y.right)
 
-    def incidence_sum(self):
-        c = 0
-
-        for a, b in itertools.product(self.elements, self.elements):
-            if self.incidence[a][b] is True:
-                c += 1
-        return c
-
     def _maxify(self):
-        for x, y in itertools.product(self.elements, self.elements):
-            if self.compare(x, y):
-                self.ordering[x][y] = True
-        # make ordering dictionary strict
-        for x in self.elements:
-            self.ordering[x][x] = False
+        """
+        y is above x when both components of y are above or equal to those
+        of x. For each component value the elements whose component is
+        above it are collected into one mask.
+        """
+        def masks(order, components):
+            by_value = {}
+            for i, c in enumerate(components):
+                by_value[c] = by_value.get(c, 0) | 1 << i
+            result = {}
+            for c in by_value:
+                mask = 0
+                for d, m in by_value.items():
+                    if order.compare(c, d):
+                        mask |= m
+                result[c] = mask
+            return result
+
+        left = masks(self.order1, [e.left for e in self._elements])
+        right = masks(self.order2, [e.right for e in self._elements])
+        self.up = [left[e.left] & right[e.right] & ~(1 << i)
+                   for i, e in enumerate(self._elements)]
+        return self.up
 
     def _minify(self):
-        i = 0
-        while i < 10000:
-            count1 = self.incidence_sum()
-            for x, y, z in itertools.product(self.elements,
-                                             self.elements, self.elements):
-                if self.incidence[x][y] and self.incidence[y][z]:
-                    self.incidence[x][z] = False
-            count2 = self.incidence_sum()
-            if count1 == count2:
-                break
-            else:
-                i += 1
+        """
+        A cover in the full product is a cover in one coordinate with
+        equality in the other. The elements here may be a proper subset of the
+        product, so from each element we walk up along product covers, stop at
+        the first elements of the subset met on each path, and keep the
+        minimal ones among those. When the subset is the whole product this
+        visits each product cover once.
+        """
+        index = dict((e.pair, i) for i, e in enumerate(self._elements))
+        self.covers = []
+        for x in self._elements:
+            found = []
+            seen = {x.pair}
+            stack = [x.pair]
+            while stack:
+                a, b = stack.pop()
+                steps = [(c, b) for c in self.order1.upper_covers(a)] + \
+                        [(a, d) for d in self.order2.upper_covers(b)]
+                for pair in steps:
+                    if pair in seen:
+                        continue
+                    seen.add(pair)
+                    if pair in index:
+                        found.append(self._elements[index[pair]])
+                    else:
+                        stack.append(pair)
+            row = 0
+            for y in found:
+                if not any(z != y and self.compare(z, y) for z in found):
+                    row |= 1 << index[y.pair]
+            self.covers.append(row)
+            if self.stats is not None:
+                self.stats.count('reduction visits', len(seen))
+        return self.covers
 
 
 class ProductOperation(Operation):
@@ -226,24 +680,324 @@ class ProductOperation(Operation):
     the component monoids.
     """
     def __init__(self, M, N, base_generators=BASE_GENERATORS):
-        self.basic_operation = Operation()
         self.operation1 = M.operation
         self.operation2 = N.operation
         self.relations = set()
         self.generators = base_generators
+        self.cayley_table = None
+        self.stats = None
+        self.index = {}
 
     def reduce(self, element):
-        return ProductElement(self.basic_operation.reduce(element.original),
-                              self.operation1.reduce(element.left),
-                              self.operation2.reduce(element.right))
+        """
+        :param element: ProductElement
+        :return: the element of the product with the same components, which
+            carries the shortest word as original
+        """
+        pair = (self.operation1.reduce(element.left),
+                self.operation2.reduce(element.right))
+        if pair in self.index:
+            return self.index[pair]
+        return ProductElement(element.original, *pair)
+
+    @property
+    def ordered_generators(self):
+        """
+        The generators in alphabetical order, in which the elements are
+        enumerated; a product has no rewriting system.
+        """
+        return sorted(self.generators)
 
     def prod(self, x, y):
         """
         Operation in the product monoid
+
+        :return: the ProductElement of the product, from the table once it
+            is built, otherwise from index
         """
-        return (self.basic_operation.reduce(x.original+y.original),
-                self.operation1.prod(x.left, y.left),
-                self.operation2.prod(x.right, y.right))
+        table = self.cayley_table
+        if table is not None:
+            return table.words[table.prod_id(table.ids[x], table.ids[y])]
+        return self.index[(self.operation1.prod(x.left, y.left),
+                           self.operation2.prod(x.right, y.right))]
+
+
+class _ProductRow(Mapping):
+    """
+    Read-only view of one row of an implicit product table.
+    """
+    def __init__(self, operation, i):
+        self._operation = operation
+        self._i = i
+
+    def __getitem__(self, y):
+        operation = self._operation
+        return operation.components[
+            operation.prod_id(self._i, operation.index[y])]
+
+    def __iter__(self):
+        return iter(self._operation.components)
+
+    def __len__(self):
+        return len(self._operation.components)
+
+
+class _ProductTable(Mapping):
+    """
+    Read-only table[x][y] view of an ImplicitProductOperation, computing
+    products on demand.
+    """
+    def __init__(self, operation):
+        self._operation = operation
+
+    def __getitem__(self, x):
+        return _ProductRow(self._operation, self._operation.index[x])
+
+    def __iter__(self):
+        return iter(self._operation.components)
+
+    def __len__(self):
+        return len(self._operation.components)
+
+
+class ImplicitProductOperation(Operation):
+    """
+    The operation in a product of any number of monoids, computed on demand
+    from the factors' tables. An element is the tuple of its component ids.
+    Elements are numbered in order of discovery: components lists them,
+    index maps them back to ids, and right[g] lists the id of x*g for each
+    generator g. The shortest word of an element is spelled out from the
+    spanning tree of parent ids and generators, so no word is stored.
+    With row_cache, that many of the most recently used rows of products
+    are kept.
+
+    :param factors: sequence of Pomonoid objects
+    :param row_cache: number of rows of products to keep
+    """
+    def __init__(self, factors, base_generators=BASE_GENERATORS,
+                 row_cache=0):
+        self.factors = list(factors)
+        self.tables = [M.operation.id_table() for M in self.factors]
+        self.relations = set()
+        self.generators = base_generators
+        self.cayley_table = None
+        self.stats = None
+        self.components = []
+        self.index = {}
+        self.parent = []
+        self.letter = []
+        self.right = dict((g, []) for g in self.ordered_generators)
+        self.table = _ProductTable(self)
+        self.row_cache = row_cache
+        self._rows = OrderedDict()
+        # columns[k][g] lists the ids of x*g in the k-th factor
+        self.columns = [
+            dict((g, table.column(table.ids[M.operation.evaluate(g)]))
+                 for g in self.ordered_generators)
+            for M, table in zip(self.factors, self.tables)]
+
+    def add(self, components, parent=None, g=None):
+        """
+        :param components: tuple of component ids of a new element
+        :param parent: id of the element it was reached from
+        :param g: generator it was reached by
+        :return: id of the new element
+        """
+        i = len(self.components)
+        self.components.append(components)
+        self.index[components] = i
+        self.parent.append(parent)
+        self.letter.append(g)
+        return i
+
+    def word(self, x):
+        """
+        :param x: element
+        :return: its shortest (shortlex least) word in the generators
+        """
+        i = self.index[x]
+        letters = []
+        while self.parent[i] is not None:
+            letters.append(self.letter[i])
+            i = self.parent[i]
+        return ''.join(reversed(letters)) or '1'
+
+    def reduce(self, word):
+        """
+        :param word: word in the generators
+        :return: the element it evaluates to
+        """
+        components = self.components[0]
+        for g in word:
+            if g != '1':
+                components = tuple(column[g][c] for column, c
+                                   in zip(self.columns, components))
+        return components
+
+    evaluate = reduce
+    ordered_generators = ProductOperation.ordered_generators
+
+    def evaluate_many(self, words, use_numpy=None):
+        """
+        :param words: iterable of words
+        :return: list of the elements the words evaluate to
+        """
+        return [self.reduce(word) for word in words]
+
+    def prod_id(self, i, j):
+        """
+        :param i, j: element ids
+        :return: id of the product
+        """
+        row = self._rows.get(i)
+        if row is not None:
+            return row[j]
+        return self.index[tuple(
+            table.prod_id(a, b) for table, a, b
+            in zip(self.tables, self.components[i], self.components[j]))]
+
+    def row(self, i):
+        """
+        :param i: element id
+        :return: array of the ids of the products of i with every element,
+            kept in the row cache
+        """
+        row = self._rows.get(i)
+        if row is not None:
+            self._rows.move_to_end(i)
+            return row
+        n = len(self.components)
+        row = array(typecode(n), (self.prod_id(i, j) for j in range(n)))
+        if self.row_cache:
+            self._rows[i] = row
+            if len(self._rows) > self.row_cache:
+                self._rows.popitem(last=False)
+        return row
+
+    def prod(self, x, y):
+        """
+        :param x, y: elements
+        :return: the product element
+        """
+        return self.components[self.prod_id(self.index[x], self.index[y])]
+
+
+class ImplicitProductOrder(Order):
+    """
+    The product order of any number of factors, compared componentwise on
+    demand. Upper covers are found as in ProductOrder._minify, by walking up
+    along the covers of one factor at a time, and are remembered once found.
+    Up-sets, down-sets, intervals, joins and meets are found by comparing
+    with every element, since there are no rows of up-sets.
+
+    :param monoid: implicit ProductPomonoid whose factors all have orders
+    """
+    def __init__(self, monoid):
+        self.operation = monoid.operation
+        self.orders = [M.order for M in self.operation.factors]
+        self.stats = monoid.stats
+        self._elements = self.operation.components
+        self._index = self.operation.index
+        self.elements = monoid.elements
+        self._upper_covers = {}
+        # steps[k][c] lists the ids of the upper covers of id c in factor k
+        self.steps = [[[table.ids[y] for y in order.upper_covers(x)]
+                       for x in table.words]
+                      for order, table in zip(self.orders,
+                                              self.operation.tables)]
+        self.ordering = RelationView(
+            self._elements,
+            predicate=lambda x, y: x != y and self.compare(x, y))
+        self.incidence = RelationView(
+            self._elements,
+            predicate=lambda x, y: y in self.upper_covers(x))
+
+    def compare(self, x, y):
+        return all(order.compare(table.words[i], table.words[j])
+                   for order, table, i, j
+                   in zip(self.orders, self.operation.tables, x, y))
+
+    def upper_covers(self, x):
+        """
+        :param x: element
+        :return: list of its upper covers, in order of their ids
+        """
+        covers = self._upper_covers.get(x)
+        if covers is None:
+            index = self._index
+            found = []
+            seen = {x}
+            stack = [x]
+            while stack:
+                y = stack.pop()
+                for k, steps in enumerate(self.steps):
+                    for c in steps[y[k]]:
+                        z = y[:k] + (c,) + y[k + 1:]
+                        if z in seen:
+                            continue
+                        seen.add(z)
+                        if z in index:
+                            found.append(z)
+                        else:
+                            stack.append(z)
+            covers = sorted((y for y in found
+                             if not any(z != y and self.compare(z, y)
+                                        for z in found)),
+                            key=index.__getitem__)
+            self._upper_covers[x] = covers
+            if self.stats is not None:
+                self.stats.count('reduction visits', len(seen))
+        return covers
+
+    def up_set(self, x):
+        """
+        :return: list of x and the elements above it
+        """
+        return [y for y in self._elements if self.compare(x, y)]
+
+    def down_set(self, x):
+        """
+        :return: list of x and the elements below it
+        """
+        return [y for y in self._elements if self.compare(y, x)]
+
+    def interval(self, x, y):
+        """
+        :return: list of the elements between x and y, both included
+        """
+        return [z for z in self._elements
+                if self.compare(x, z) and self.compare(z, y)]
+
+    @staticmethod
+    def _least(elements, compare):
+        """
+        :param compare: function (x, y) -> bool, true when x is below y
+        :return: the element below all the others, or None; if there is
+            one, it is the last element met below the one found so far
+        """
+        least = None
+        for y in elements:
+            if least is None or compare(y, least):
+                least = y
+        if least is not None and all(compare(least, y) for y in elements):
+            return least
+        return None
+
+    def join(self, x, y):
+        """
+        :return: the least element above x and y, or None
+        """
+        return self._least([z for z in self._elements
+                            if self.compare(x, z) and self.compare(y, z)],
+                           self.compare)
+
+    def meet(self, x, y):
+        """
+        :return: the greatest element below x and y, or None
+        """
+        return self._least([z for z in self._elements
+                            if self.compare(z, x) and self.compare(z, y)],
+                           lambda a, b: self.compare(b, a))
 
 
 class Pomonoid(object):
@@ -251,6 +1005,17 @@ class Pomonoid(object):
     A partially ordered monoid object. The monoid is usually finite, generated
     from an initial set of generators and subject to given relations. An Order
     object can be attached via the attach_order method.
+
+    Elements are enumerated until no new element appears, so an infinite
+    monoid needs max_length, the longest word (in generators) to multiply out.
+    With table_backend='array' (or 'numpy') the Cayley table is kept as a
+    compact integer matrix over element ids rather than a dict-of-dicts.
+    With lazy=True nothing is enumerated up front: elements can be streamed
+    with iter_elements, table rows with iter_products, or everything built
+    later with build. With workers=N, enumeration and table construction
+    are spread over N processes, with the same result as the serial code.
+    An instrumentation.Stats given as stats is shared with the operation and
+    the order, and collects timings and counters of every phase.
     """
     def __init__(self, elements=set(), relations=set(),
                  ordering=set(),
@@ -258,89 +1023,330 @@ class Pomonoid(object):
                  override_elements=False,
                  override_table=dict(),
                  base_relations=BASE_RELATIONS,
-                 base_generators=BASE_GENERATORS):
+                 base_generators=BASE_GENERATORS,
+                 max_length=None,
+                 table_backend='dict',
+                 lazy=False,
+                 workers=None,
+                 stats=None):
         self.is_export = is_export
+        self.max_length = max_length
+        self.workers = workers
+        self.stats = stats
         if not is_export:
             self.operation = Operation(relations=relations,
                                        base_generators=base_generators,
-                                       base_relations=base_relations)
+                                       base_relations=base_relations,
+                                       stats=stats)
             if override_elements:
                 self.elements = elements
             else:
                 self.elements = base_generators.union(elements).union({'1'})
 
-            self._generate_elements()
-            self.operation._generate_table(self.elements)
+            if not lazy:
+                self.build(table_backend=table_backend)
         else:
             self.elements = override_elements
             self.operation = Operation(relations=relations,
-                                       override_table=override_table)
+                                       override_table=override_table,
+                                       base_generators=base_generators,
+                                       base_relations=base_relations,
+                                       stats=stats)
 
     def attach_order(self, ordering=set,
                      override_ordering=dict(),
                      override_incidence=dict()):
-        if not self.is_export:
-            self.order = Order(ordering, self.elements)
-        else:
-            self.order = Order(override_incidence=override_incidence,
-                               override_ordering=override_ordering)
+        with instrumentation.phase(self.stats, 'order'):
+            if not self.is_export:
+                self.order = Order(ordering, self.elements, stats=self.stats)
+            else:
+                self.order = Order(override_incidence=override_incidence,
+                                   override_ordering=override_ordering,
+                                   stats=self.stats)
+
+    def build(self, table_backend='dict', table=True):
+        """
+        Enumerate the elements and, unless table is False, build the Cayley
+        table. This is what __init__ does when the Pomonoid is not lazy.
+
+        :param table_backend: 'dict', 'array' or 'numpy'
+        :param table: whether to build the table
+        """
+        self._generate_elements()
+        if table:
+            self.operation._generate_table(self.normal_forms,
+                                           right_cayley=self.right_cayley,
+                                           backend=table_backend,
+                                           workers=self.workers)
+
+    def iter_elements(self, max_length=None, right_cayley=None):
+        """
+        Froidure-Pin style enumeration: known normal forms are multiplied on
+        the right by each generator, breadth first, until no new element
+        appears. Normal forms are yielded in shortlex order as they are
+        found, so the caller may stop at any point.
+
+        :param max_length: longest word (in generators) to multiply out
+        :param right_cayley: optional dict, filled with {x: {g: x*g}} for
+            each element x whose products have been computed
+        :return: generator of normal forms, starting with '1'
+        """
+        reduce = self.operation.reduce
+        generators = self.operation.ordered_generators
+        depth = {'1': 0}
+        queue = ['1']
+        yield '1'
+        for x in queue:
+            if max_length is not None and depth[x] >= max_length:
+                continue
+            prefix = '' if x == '1' else x
+            row = {}
+            for g in generators:
+                y = reduce(prefix + g)
+                row[g] = y
+                if y not in depth:
+                    depth[y] = depth[x] + 1
+                    queue.append(y)
+                    yield y
+            if right_cayley is not None:
+                right_cayley[x] = row
 
     def _generate_elements(self):
-        self.elements = {'1'}
-        n = 1
-        while n < 10:
-            start = len(self.elements)
-            self.elements = self.elements.union(
-                self._generate_n_words(n))
-            if len(self.elements) > start:
-                n += 1
+        """
+        Enumerate the elements with iter_elements, recording the right Cayley
+        graph as right_cayley and the normal forms in shortlex order as
+        normal_forms. With workers, each level of the breadth first search is
+        computed by parallel.enumerate_elements instead.
+        """
+        with instrumentation.phase(self.stats, 'elements'):
+            if self.workers:
+                self.normal_forms, self.right_cayley = \
+                    parallel.enumerate_elements(self.operation,
+                                                self.max_length,
+                                                workers=self.workers)
             else:
-                break
+                self.right_cayley = {}
+                self.normal_forms = list(
+                    self.iter_elements(self.max_length, self.right_cayley))
+            self.elements = set(self.normal_forms)
+        self._count_enumeration()
 
-    def _generate_n_words(self, n):
+    def _count_enumeration(self, words=None):
         """
-        :param n: integer length of words to be generated
-        :return: Set of elements resulting after reduction
+        Record the number of products computed during enumeration (words)
+        against the number of distinct elements found.
+
+        :param words: number of products, by default read off right_cayley
         """
-        result = set()
-        for combination in itertools.product(*[self.operation.generators]*n):
-            new_elt = ''.join(combination)
-            result.add(self.operation.reduce(new_elt))
-        return result
+        stats = self.stats
+        if stats is None:
+            return
+        if words is None:
+            words = sum(len(row) for row in self.right_cayley.values())
+        stats.count('words', words)
+        stats.count('elements', len(self.normal_forms))
+        stats.emit('enumerated', words=words,
+                   elements=len(self.normal_forms))
 
-    def draw(self, file):
-        try:
-            import graphviz as gv
-        except ImportError:
-            print("You need to install the graphviz software first, and "
-                  "also the python graphviz module.")
+    def iter_products(self):
+        """
+        Yield the rows of the Cayley table one at a time, without storing the
+        table. Each row is composed from the right Cayley graph, so no word is
+        reduced. The elements are enumerated first if necessary.
+
+        :return: generator of (x, {y: x*y}) in shortlex order of x
+        """
+        if self.operation.table:
+            for x in self.operation.table:
+                yield x, dict(self.operation.table[x])
+            return
+        if not hasattr(self, 'right_cayley'):
+            self._generate_elements()
+        words = self.normal_forms
+        if len(self.right_cayley) < len(words):
+            raise ValueError("the enumeration was truncated by max_length")
+        right, tree = spanning_tree(words, self.right_cayley)
+        row = [0] * len(words)
+        for i, x in enumerate(words):
+            row[0] = i
+            for j, parent, g in tree[1:]:
+                row[j] = right[g][row[parent]]
+            yield x, dict((y, words[k]) for y, k in zip(words, row))
+
+    def green(self):
+        """
+        :return: green.GreenRelations of the monoid (its R-, L-, H- and
+            J-classes, idempotents and ideals), computed once
+        """
+        if getattr(self, '_green', None) is None:
+            self._green = green.GreenRelations(self)
+        return self._green
+
+    def verify(self, use_numpy=None):
+        """
+        Check the axioms of a partially ordered monoid: associativity, '1'
+        as identity, the order being a partial order, and monotonicity of
+        multiplication on both sides.
+
+        :param use_numpy: force or avoid NumPy, by default used if available
+        :return: list of axioms.Violation, empty if the pomonoid is valid
+        """
+        return axioms.verify(self, use_numpy=use_numpy)
+
+    def add_relations(self, relations, table_backend=None):
+        """
+        The quotient by further relations, computed from the table of this
+        monoid instead of enumerating the new presentation: the least
+        congruence identifying both sides of each relation is found by
+        union-find (see congruence.py), and each class is named by its
+        shortlex least element. The order is carried across when the order
+        it induces on the classes is still antisymmetric, otherwise the
+        quotient has no order.
+
+        :param relations: iterable of (word, word) pairs
+        :param table_backend: backend of the quotient table, by default the
+            same as this monoid's
+        :return: Pomonoid of the quotient
+        """
+        relations = set(relations)
+        table = self.operation.id_table()
+        name = getattr(self, 'word', str)
+        words = [name(e) for e in table.words]
+        ids = dict((w, i) for i, w in enumerate(words))
+        generators = dict((g, ids[name(self.operation.evaluate(g))])
+                          for g in self.operation.ordered_generators)
+
+        def evaluate(word):
+            return ids[name(self.operation.evaluate(word))]
+
+        root = congruence.closure(
+            table, list(generators.values()),
+            [(evaluate(u), evaluate(v)) for u, v in relations])
 
-        gr = gv.Digraph(format='png')
-        for e in self.elements:
-            gr.node("%s" % e)
-        for e, f in itertools.product(self.elements, self.elements):
-            if self.order.incidence[e][f]:
-                gr.edge("%s" % e, "%s" % f)
-        gr.render('img/%s' % file)
+        if hasattr(self, 'export_relations'):
+            presentation = identity_relations(
+                self.operation.generators).union(self.export_relations())
+        else:
+            presentation = self.operation.relations
+        key = shortlex_key(presentation.union(relations),
+                           self.operation.generators)
+        least = {}
+        for i, r in enumerate(root):
+            if r not in least or key(words[i]) < key(words[least[r]]):
+                least[r] = i
+        normal_forms = sorted((words[i] for i in least.values()), key=key)
+        rename = dict((words[i], i) for i in least.values())
+        representative = [words[least[r]] for r in root]
+
+        quotient = Pomonoid(relations=relations,
+                            base_relations=presentation,
+                            base_generators=self.operation.generators,
+                            lazy=True)
+        quotient.normal_forms = normal_forms
+        quotient.elements = set(normal_forms)
+        quotient.right_cayley = dict(
+            (x, dict((g, representative[table.prod_id(rename[x], j)])
+                     for g, j in generators.items()))
+            for x in normal_forms)
+        if table_backend is None:
+            table_backend = 'dict' if isinstance(self.operation.table, dict) \
+                else table.backend
+        quotient.operation._generate_table(normal_forms,
+                                           right_cayley=quotient.right_cayley,
+                                           backend=table_backend)
+
+        if hasattr(self, 'order'):
+            position = dict((x, k) for k, x in enumerate(normal_forms))
+            element = dict((name(e), e) for e in table.words)
+            direct = [0] * len(normal_forms)
+            for i, x in enumerate(words):
+                for y in self.order.upper_covers(element[x]):
+                    a = position[representative[i]]
+                    b = position[representative[ids[name(y)]]]
+                    if a != b:
+                        direct[a] |= 1 << b
+            up = bitsets.closure(direct)
+            if not any(row >> k & 1 for k, row in enumerate(up)):
+                quotient.attach_order(ordering=set(
+                    (normal_forms[a], normal_forms[b])
+                    for a, row in enumerate(direct)
+                    for b in bitsets.bits(row)))
+        return quotient
+
+    def draw(self, file, format='png', layered=False):
+        """
+        Write the Hasse diagram as DOT to img/file, and render it to
+        img/file.png if the graphviz dot program is installed.
+
+        :param file: file name in img
+        :param format: output format of dot
+        :param layered: whether to draw elements of equal rank level
+        """
+        written = hasse.draw_all({file: self}, format=format,
+                                 layered=layered)
+        if len(written) == 1:
+            print("Install the graphviz software to render %s" % written[0])
 
 
 class ProductPomonoid(Pomonoid):
     """
-    Form the product of two Pomonoid objects. The elements and operation are
-    determined automatically. If both inputs have orders, the product order
+    Form the product of Pomonoid objects. The elements and operation are
+    determined automatically. If all inputs have orders, the product order
     is also determined automatically.
 
-    :param M1: Pomonoid object
-    :param M2: Pomonoid object
+    The elements are those of the submonoid generated by the diagonal
+    generators. Each one keeps its shortest (shortlex least) generating word
+    as `original`, and index maps (left, right) pairs to elements.
+
+    A product of two factors is materialised: its table and order are built.
+    With implicit=True, the default for any other number of factors, the
+    elements are tuples of component ids, see ImplicitProductOperation, and
+    products and comparisons are computed from the factors when asked for.
+    Only the index of the generated elements is built, and word(x) spells
+    out the shortest word of an element.
+
+    :param factors: Pomonoid objects
+    :param table_backend: 'dict', 'array' or 'numpy', as for Pomonoid
+    :param workers: optional number of processes building the table
+    :param stats: optional instrumentation.Stats, as for Pomonoid
+    :param implicit: whether to compute products on demand
+    :param row_cache: with implicit, number of rows of products to cache
     """
-    def __init__(self, M1, M2):
-        self.M1 = M1
-        self.M2 = M2
-        self.relation_tracker = {'1':set(), 'a':set()}
+    def __init__(self, *factors, table_backend='dict', workers=None,
+                 stats=None, implicit=None, row_cache=0):
+        if implicit is None:
+            implicit = len(factors) != 2
+        self.factors = factors
+        self.implicit = implicit
+        self.workers = workers
+        self.stats = stats
+        self.relation_tracker = {'1': set()}
+        if implicit:
+            self.operation = ImplicitProductOperation(factors,
+                                                      row_cache=row_cache)
+            self.operation.stats = stats
+            with instrumentation.phase(stats, 'elements'):
+                self._generate_implicit()
+            self._count_enumeration(
+                len(self.normal_forms) * len(self.operation.right))
+            if all(hasattr(M, 'order') for M in factors):
+                self.attach_order()
+            return
+        if len(factors) != 2:
+            raise ValueError("only products of two factors are materialised,"
+                             " use implicit=True")
+        self.M1, self.M2 = factors
         self.elements = set()
         self.operation = ProductOperation(self.M1, self.M2)
-        self._generate_elements()
-        self.operation._generate_table(self.elements)
+        self.operation.stats = stats
+        with instrumentation.phase(stats, 'elements'):
+            self._generate_elements()
+        self._count_enumeration()
+        self.operation.index = self.index
+        self.operation._generate_table(self.normal_forms,
+                                       right_cayley=self.right_cayley,
+                                       backend=table_backend,
+                                       workers=self.workers)
         self.lookup = dict((e.original, e) for e in self.elements)
         if hasattr(self.M1, 'order') and hasattr(self.M2, 'order'):
             self.attach_order()
@@ -348,70 +1354,174 @@ class ProductPomonoid(Pomonoid):
 
     @property
     def pairs(self):
-        return set((e.left, e.right) for e in self.elements)
+        return set(self.index)
 
     def attach_order(self):
-        self.order = ProductOrder(self.M1, self.M2, self.elements)
-
-    def _generate_elements(self):
-        self.elements = {ProductElement('1', '1', '1')}
-        n = 1
-        while n < 1000:
-            start = len(self.elements)
-            self._generate_n_words(n)
-            if len(self.elements) > start:
-                n += 1
+        with instrumentation.phase(self.stats, 'order'):
+            if self.implicit:
+                self.order = ImplicitProductOrder(self)
             else:
-                break
+                self.order = ProductOrder(self.M1, self.M2,
+                                          self.normal_forms, stats=self.stats)
 
-    def _generate_n_words(self, n):
+    def _generate_implicit(self):
         """
-        :param n: integer length of words to be generated
-        :return: Set of elements resulting after reduction
+        Breadth first search as in _generate_elements, over tuples of
+        component ids of any length, recorded in the operation. Relations
+        are not tracked, export_relations reads them off the operation.
         """
-        result = set()
-        for combination in itertools.product(*[self.operation.generators]*n):
-            seq = ''.join(combination)
-            new_elt = self.operation.reduce(ProductElement(seq, seq, seq))
-            if new_elt.pair not in self.pairs:
-                self.elements.add(new_elt)
-                self.relation_tracker[new_elt.original] = set()
-            else:
-                for e in self.elements:
-                    if e.pair == new_elt.pair:
-                        old_elt = e
-                if old_elt.original != new_elt.original:
-                    self.relation_tracker[old_elt.original].add(new_elt.original)
-                    pair = (old_elt.__str__(), new_elt.__str__())
-                    pair = tuple(sorted(pair, key=len, reverse=True))
-                    self.operation.relations.add(pair)
+        operation = self.operation
+        columns = operation.columns
+        index = operation.index
+        operation.add(tuple(table.ids['1'] for table in operation.tables))
+        for i, x in enumerate(operation.components):
+            for g, right in operation.right.items():
+                y = tuple(column[g][c] for column, c in zip(columns, x))
+                k = index.get(y)
+                if k is None:
+                    k = operation.add(y, i, g)
+                right.append(k)
+        self.normal_forms = operation.components
+        self.elements = set(self.normal_forms)
+        self.index = index
 
-    def export(self):
-        elements = set(x.original for x in self.elements)
-        table = dict((x.original, dict((y.original, self.operation.table[x][y])
-                     for y in self.operation.table[x]))
-                     for x in self.operation.table)
-        if hasattr(self, 'order'):
-            incidence = dict(
-                (x.original, dict((y.original, self.order.incidence[x][y])
-                                  for y in self.order.incidence[x]))
-                for x in self.order.incidence)
-            ordering = dict(
-                (x.original, dict((y.original, self.order.ordering[x][y])
-                                  for y in self.order.ordering[x]))
-                for x in self.order.ordering)
+    def word(self, x):
+        """
+        :param x: element
+        :return: its shortest word, the original of a ProductElement
+        """
+        if self.implicit:
+            return self.operation.word(x)
+        return x.original
+
+    def _generate_elements(self):
+        """
+        Breadth first search over (left, right) pairs: each known element is
+        multiplied on the right by each diagonal generator using the component
+        tables, so every element is reached first by its shortest word. Words
+        reaching an element already found are recorded in relation_tracker.
+
+        The search runs on pairs of component ids, stored in component_ids,
+        and looks products up in the columns of the generators in the
+        component tables.
+        """
+        generators = self.operation.ordered_generators
+        operation1 = self.operation.operation1
+        operation2 = self.operation.operation2
+        table1 = operation1.id_table()
+        table2 = operation2.id_table()
+        columns1 = dict((g, table1.column(table1.ids[operation1.evaluate(g)]))
+                        for g in generators)
+        columns2 = dict((g, table2.column(table2.ids[operation2.evaluate(g)]))
+                        for g in generators)
+        words1 = table1.words
+        words2 = table2.words
+
+        identity = ProductElement('1', '1', '1', 0)
+        self.normal_forms = [identity]
+        self.component_ids = [(table1.ids['1'], table2.ids['1'])]
+        ids = {self.component_ids[0]: 0}
+        self.right_cayley = {}
+        for x, (i, j) in zip(self.normal_forms, self.component_ids):
+            prefix = '' if x.original == '1' else x.original
+            row = {}
+            for g in generators:
+                pair = (columns1[g][i], columns2[g][j])
+                word = prefix + g
+                k = ids.get(pair)
+                if k is None:
+                    k = ids[pair] = len(self.normal_forms)
+                    y = ProductElement(word, words1[pair[0]],
+                                       words2[pair[1]], k)
+                    self.normal_forms.append(y)
+                    self.component_ids.append(pair)
+                    self.relation_tracker[word] = set()
+                else:
+                    y = self.normal_forms[k]
+                    if y.original != word:
+                        self.relation_tracker[y.original].add(word)
+                        self.operation.relations.add((word, y.original))
+                row[g] = y
+            self.right_cayley[x] = row
+        self.elements = set(self.normal_forms)
+        self.index = dict((y.pair, y) for y in self.normal_forms)
+        self.operation.generator_elements = self.right_cayley[identity]
+
+    def export_relations(self):
+        """
+        :return: set of (word, original) relations from relation_tracker,
+            or from the spanning tree of an implicit product: each product
+            of an element and a generator that is not a tree edge
+        """
+        if self.implicit:
+            operation = self.operation
+            words = [operation.word(x) for x in operation.components]
+            relations = set()
+            for g, right in operation.right.items():
+                for i, k in enumerate(right):
+                    if operation.parent[k] != i or operation.letter[k] != g:
+                        prefix = '' if i == 0 else words[i]
+                        relations.add((prefix + g, words[k]))
+            return relations
         relations = set()
         for k in self.relation_tracker:
             for item in self.relation_tracker[k]:
                 if len(item) >= len(k):
                     relations.add((item, k))
+        return relations
 
-        result = Pomonoid(relations=relations,
+    def export(self):
+        """
+        :return: Pomonoid over the original words, with the table and order
+            of the product translated from element ids. An implicit product
+            is materialised here.
+        """
+        if self.implicit:
+            return self._export_implicit()
+        table = self.operation.cayley_table
+        words = [x.original for x in table.words]
+        elements = set(words)
+        columns = [table.column(j) for j in range(table.size)]
+        table = dict((x, dict((y, words[columns[j][i]])
+                              for j, y in enumerate(words)))
+                     for i, x in enumerate(words))
+        result = Pomonoid(relations=self.export_relations(),
                           override_table=table,
+                          base_relations=identity_relations(
+                              self.operation.generators),
                           override_elements=elements,
                           is_export=True)
+        result.operation.generator_elements = dict(
+            (g, x.original)
+            for g, x in self.right_cayley[self.normal_forms[0]].items())
+        if hasattr(self, 'order'):
+            order = self.order
+            result.order = Order.from_rows(
+                [x.original for x in order._elements],
+                list(order.up), list(order.covers))
+        return result
+
+    def _export_implicit(self):
+        operation = self.operation
+        elements = operation.components
+        words = [operation.word(x) for x in elements]
+        table = dict((x, dict((y, words[k])
+                              for y, k in zip(words, operation.row(i))))
+                     for i, x in enumerate(words))
+        result = Pomonoid(relations=self.export_relations(),
+                          override_table=table,
+                          base_relations=identity_relations(
+                              self.operation.generators),
+                          override_elements=set(words),
+                          is_export=True)
+        result.operation.generator_elements = dict(
+            (g, words[right[0]]) for g, right in operation.right.items())
         if hasattr(self, 'order'):
-            result.attach_order(override_incidence=incidence,
-                                override_ordering=ordering,
-            )
+            index = operation.index
+            covers = [0] * len(elements)
+            for i, x in enumerate(elements):
+                for y in self.order.upper_covers(x):
+                    covers[i] |= 1 << index[y]
+            result.order = Order.from_rows(words, bitsets.closure(covers),
+                                           covers)
         return result
@@ -0,0 +1,364 @@
+import hashlib
+import weakref
+from array import array
+from collections import OrderedDict, deque, namedtuple
+
+# Budget for the Knuth-Bendix completion. Presentations which do not complete
+# within the budget keep the rules found so far, which still reduce words
+# correctly but may leave several normal forms for one element.
+MAX_RULES = 2000
+MAX_STEPS = 50000
+
+# Number of words whose normal forms are remembered per presentation
+CACHE_SIZE = 100000
+
+# Number of proper prefixes, longest first, looked up to resume a reduction
+PREFIX_PROBES = 16
+
+CacheInfo = namedtuple('CacheInfo', 'hits prefix_hits misses maxsize currsize')
+
+
+def fingerprint(relations, letters=()):
+    """
+    :param relations: iterable of (word, word) pairs
+    :param letters: letters of the presentation besides those in relations
+    :return: hex digest identifying the presentation, stable across runs
+    """
+    text = repr((sorted(set(letters)), sorted(set(relations))))
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class NormalFormCache(object):
+    """
+    A bounded word -> normal form cache with LRU eviction. Entries also keep
+    the automaton states along the normal form, so that a word extending a
+    cached word can be reduced starting from the cached normal form.
+
+    :param maxsize: largest number of words kept, 0 disables the cache
+    """
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self.hits = 0
+        self.prefix_hits = 0
+        self.misses = 0
+
+    def get(self, word):
+        """
+        :return: (normal form, states) for word, or None
+        """
+        entry = self._data.get(word)
+        if entry is not None:
+            self._data.move_to_end(word)
+        return entry
+
+    def put(self, word, entry):
+        if not self.maxsize:
+            return
+        self._data[word] = entry
+        self._data.move_to_end(word)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def info(self):
+        """
+        :return: CacheInfo of the hit, prefix hit and miss counts and sizes
+        """
+        return CacheInfo(self.hits, self.prefix_hits, self.misses,
+                         self.maxsize, len(self._data))
+
+    def clear(self):
+        self._data.clear()
+        self.hits = self.prefix_hits = self.misses = 0
+
+
+def alphabet_order(letters, relations):
+    """
+    Choose an ordering of the letters for the shortlex order. Equal-length
+    relations are oriented the way they are written wherever possible, so
+    that the normal forms agree with the words the relations were written
+    in. The identity '1' comes first, and the remaining ties are broken
+    alphabetically.
+
+    :param letters: iterable of single-character strings
+    :param relations: iterable of (word, word) pairs
+    :return: list of letters, smallest first
+    """
+    letters = set(letters)
+    above = dict((c, set()) for c in letters)
+    for x, y in relations:
+        if len(x) != len(y) or x == y:
+            continue
+        for p, q in zip(x, y):
+            if p != q:
+                # x is written as the larger word, so p > q
+                above[q].add(p)
+                break
+    below_count = dict((c, 0) for c in letters)
+    for q in above:
+        for p in above[q]:
+            below_count[p] += 1
+
+    def key(c):
+        return (c != '1', c)
+
+    result = []
+    ready = sorted((c for c in letters if below_count[c] == 0), key=key)
+    while ready:
+        c = ready.pop(0)
+        result.append(c)
+        for p in above[c]:
+            below_count[p] -= 1
+            if below_count[p] == 0:
+                ready.append(p)
+        ready.sort(key=key)
+    if len(result) < len(letters):
+        # the written orientations are inconsistent, fall back to the default
+        return sorted(letters, key=key)
+    return result
+
+
+def shortlex_key(relations, letters=()):
+    """
+    :param relations: iterable of (word, word) pairs
+    :param letters: letters to include besides those in the relations
+    :return: the sort key of the rewriting system of the presentation,
+        without completing it
+    """
+    relations = sorted(set(relations))
+    letters = set(letters).union(''.join(x + y for x, y in relations))
+    rank = dict((c, i)
+                for i, c in enumerate(alphabet_order(letters, relations)))
+
+    def key(word):
+        return (len(word), [rank[c] for c in word])
+    return key
+
+
+class RewritingSystem(object):
+    """
+    A RewritingSystem is a confluent (when completion succeeds) set of
+    shortlex-decreasing rules obtained from a set of relations by
+    Knuth-Bendix completion. Words are reduced in a single left-to-right
+    pass driven by an Aho-Corasick automaton over the left-hand sides.
+
+    :param relations: iterable of (word, word) pairs
+    :param letters: letters to include besides those in the relations
+    :param alphabet: optional sequence of letters, smallest first
+    :param max_rules: stop completion once this many rules exist
+    :param max_steps: stop completion after this many equations
+    :param cache_size: size of the normal form cache
+    """
+    _shared = weakref.WeakValueDictionary()
+
+    def __init__(self, relations, letters=(), alphabet=None,
+                 max_rules=MAX_RULES, max_steps=MAX_STEPS,
+                 cache_size=CACHE_SIZE):
+        self.cache = NormalFormCache(cache_size)
+        relations = sorted(set(relations))
+        letters = set(letters).union(''.join(x + y for x, y in relations))
+        if alphabet is None:
+            alphabet = alphabet_order(letters, relations)
+        else:
+            alphabet = list(alphabet)
+            alphabet += sorted(letters.difference(alphabet))
+        self.alphabet = tuple(alphabet)
+        self._rank = dict((c, i) for i, c in enumerate(self.alphabet))
+        self.rules = {}
+        self.confluent = self._complete(relations, max_rules, max_steps)
+        if self._stale:
+            self._build_automaton()
+
+    @classmethod
+    def shared(cls, relations, letters=()):
+        """
+        Return the rewriting system of a presentation, completing it only if
+        no live instance for an identical presentation exists. Operations
+        built from the same presentation thereby share rules and cache.
+
+        :param relations: iterable of (word, word) pairs
+        :param letters: letters to include besides those in the relations
+        """
+        key = fingerprint(relations, letters)
+        system = cls._shared.get(key)
+        if system is None:
+            system = cls(relations, letters=letters)
+            cls._shared[key] = system
+        return system
+
+    @classmethod
+    def unshare(cls):
+        """
+        Stop handing out the live systems, so that each presentation is
+        completed afresh, with an empty cache, the next time it is used.
+        Systems already in use are not affected.
+        """
+        cls._shared.clear()
+
+    def __getstate__(self):
+        # sent to worker processes without the cached normal forms
+        state = dict(self.__dict__)
+        state['cache'] = NormalFormCache(self.cache.maxsize)
+        return state
+
+    def key(self, word):
+        """
+        :param word: word (string)
+        :return: sort key realising the shortlex order
+        """
+        return (len(word), [self._rank[c] for c in word])
+
+    def _orient(self, u, v):
+        if self.key(u) > self.key(v):
+            return u, v
+        return v, u
+
+    def _rewrite(self, word):
+        """
+        Reduce a word with the current rules while completion is running. The
+        automaton is rebuilt only when the rules have changed since last use.
+        """
+        if self._stale:
+            self._build_automaton()
+            self._stale = False
+        return ''.join(self._run(word, [], [0])[0])
+
+    def _complete(self, relations, max_rules, max_steps):
+        """
+        Knuth-Bendix completion with respect to the shortlex order.
+
+        :return: True if the rules are confluent, False if the budget ran out
+        """
+        rules = self.rules
+        pending = deque(relations)
+        steps = 0
+        self._stale = True
+        while pending:
+            steps += 1
+            if steps > max_steps or len(rules) > max_rules:
+                return False
+            u, v = pending.popleft()
+            u = self._rewrite(u)
+            v = self._rewrite(v)
+            if u == v:
+                continue
+            lhs, rhs = self._orient(u, v)
+            # keep the rules interreduced
+            for l, r in sorted(rules.items()):
+                if lhs in l:
+                    del rules[l]
+                    pending.append((l, r))
+            rules[lhs] = rhs
+            self._stale = True
+            for l, r in sorted(rules.items()):
+                if lhs in r:
+                    rules[l] = self._rewrite(r)
+            # critical pairs of the new rule with every rule, itself included
+            for l, r in sorted(rules.items()):
+                pending.extend(self._overlaps(lhs, rhs, l, r))
+                if l != lhs:
+                    pending.extend(self._overlaps(l, r, lhs, rhs))
+        return True
+
+    @staticmethod
+    def _overlaps(l1, r1, l2, r2):
+        """
+        Critical pairs from a proper suffix of l1 overlapping a prefix of l2.
+        """
+        for k in range(1, min(len(l1), len(l2))):
+            if l1[-k:] == l2[:k]:
+                yield (r1 + l2[k:], l1[:-k] + r2)
+
+    def _build_automaton(self):
+        """
+        Build the Aho-Corasick automaton over the left-hand sides. Each state
+        records the rule, if any, whose left-hand side ends at that state.
+        """
+        goto = [{}]
+        match = [None]
+        for lhs in sorted(self.rules):
+            s = 0
+            for c in lhs:
+                if c not in goto[s]:
+                    goto.append({})
+                    match.append(None)
+                    goto[s][c] = len(goto) - 1
+                s = goto[s][c]
+            match[s] = (len(lhs), self.rules[lhs], lhs)
+
+        # complete the transitions breadth first along the failure links
+        delta = [dict() for _ in goto]
+        fail = [0] * len(goto)
+        delta[0] = dict(goto[0])
+        queue = deque(goto[0].values())
+        while queue:
+            s = queue.popleft()
+            if match[s] is None:
+                match[s] = match[fail[s]]
+            delta[s] = dict(delta[fail[s]])
+            for c, t in goto[s].items():
+                fail[t] = delta[fail[s]].get(c, 0)
+                delta[s][c] = t
+                queue.append(t)
+        self._delta = delta
+        self._match = match
+        self._state_code = 'H' if len(delta) <= 1 << 16 else 'I'
+
+    def _run(self, word, out, states, counts=None):
+        """
+        Feed word to the automaton after the letters already in out, whose
+        states are listed in states, rewriting whenever a rule matches.
+
+        :param counts: optional Counter of applications of each (lhs, rhs)
+        :return: (letters, states) of the normal form
+        """
+        delta = self._delta
+        match = self._match
+        todo = list(reversed(word))
+        while todo:
+            c = todo.pop()
+            s = delta[states[-1]].get(c, 0)
+            out.append(c)
+            states.append(s)
+            rule = match[s]
+            if rule is not None:
+                n, rhs, lhs = rule
+                if counts is not None:
+                    counts[lhs, rhs] += 1
+                del out[-n:]
+                del states[-n:]
+                todo.extend(reversed(rhs))
+        return out, states
+
+    def reduce(self, word, counts=None):
+        """
+        Words already in the cache are looked up. Otherwise reduction resumes
+        from the normal form of the longest cached prefix, if one of the
+        PREFIX_PROBES longest prefixes is cached.
+
+        :param word: word (string) to be reduced
+        :param counts: optional Counter of applications of each (lhs, rhs)
+        :return: normal form of the word (string)
+        """
+        cache = self.cache
+        entry = cache.get(word)
+        if entry is not None:
+            cache.hits += 1
+            return entry[0]
+        for k in range(len(word) - 1,
+                       max(len(word) - 1 - PREFIX_PROBES, 0), -1):
+            entry = cache.get(word[:k])
+            if entry is not None:
+                cache.prefix_hits += 1
+                out, states = self._run(word[k:], list(entry[0]),
+                                        list(entry[1]), counts)
+                break
+        else:
+            cache.misses += 1
+            out, states = self._run(word, [], [0], counts)
+        normal_form = ''.join(out)
+        entry = (normal_form, array(self._state_code, states))
+        cache.put(word, entry)
+        if normal_form != word:
+            cache.put(normal_form, entry)
+        return normal_form
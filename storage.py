@@ -0,0 +1,226 @@
+"""
+Save computed pomonoids to a compact binary file and load them back with the
+arrays memory-mapped rather than parsed.
+
+A file holds the magic bytes, the format version and the length of a JSON
+header (two little-endian uint32), then the header itself, padded to a
+multiple of 8 bytes, followed by
+    - the Cayley table: n*n ids column by column, in the header's typecode
+    - the ordering: n packed bitset rows of the strict up-sets
+    - the incidence: n packed bitset rows of the covers
+the two orders being present only when the pomonoid has an order.
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+import bitsets
+from cayley import CayleyTable, typecode
+from pomonoid import (BASE_GENERATORS, BASE_RELATIONS, Order, Pomonoid,
+                      ProductPomonoid, identity_relations)
+from rewriting import fingerprint
+
+MAGIC = b'POMONOID'
+VERSION = 1
+
+# Directory of the content-addressed cache used by cached_pomonoid
+CACHE_DIR = os.environ.get(
+    'POMONOID_CACHE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'pomonoid'))
+
+
+def _cayley_table(monoid):
+    table = monoid.operation.cayley_table
+    if table is None:
+        table = CayleyTable.from_dict(monoid.operation.table)
+    return table
+
+
+def encode(monoid):
+    """
+    Serialise a Pomonoid or ProductPomonoid. Elements of a product are
+    stored by their shortest words, as export() does.
+
+    :param monoid: Pomonoid object with a complete table
+    :return: (header dict, bytes of the table, bytes of the up-set and
+        cover rows, empty if there is no order)
+    """
+    table = _cayley_table(monoid)
+    elements = table.words
+    n = len(elements)
+    word = getattr(monoid, 'word', None)
+    name = str if word is None else word
+    words = [name(e) for e in elements]
+    if isinstance(monoid, ProductPomonoid):
+        relations = identity_relations(monoid.operation.generators).union(
+            monoid.export_relations())
+    else:
+        relations = monoid.operation.relations
+    tracker = getattr(monoid, 'relation_tracker', {})
+
+    code = typecode(n)
+    data = array(code)
+    for j in range(n):
+        data.extend(table.column(j))
+
+    order = getattr(monoid, 'order', None)
+    rows = b''
+    if order is not None:
+        if hasattr(order, 'covers'):
+            position = [0] * n
+            for i, e in enumerate(elements):
+                position[order._index[e]] = i
+            covers = bitsets.permute(order.covers, position)
+            up = bitsets.permute(order.up, position)
+        else:
+            covers = [0] * n
+            for i, e in enumerate(elements):
+                for f in order.upper_covers(e):
+                    covers[i] |= 1 << table.ids[f]
+            up = bitsets.closure(covers)
+        rows = bitsets.pack(up, n) + bitsets.pack(covers, n)
+
+    header = {
+        'words': words,
+        'generators': sorted(monoid.operation.generators),
+        'generator_elements': dict(
+            (g, name(monoid.operation.evaluate(g)))
+            for g in monoid.operation.generators),
+        'relations': sorted(relations),
+        'relation_tracker': dict((k, sorted(v)) for k, v in tracker.items()),
+        'typecode': code,
+        'byteorder': sys.byteorder,
+        'ordered': order is not None,
+    }
+    return header, data.tobytes(), rows
+
+
+def decode(header, data, rows=b''):
+    """
+    Rebuild a Pomonoid from the parts written by encode, without copying
+    the table and order rows.
+
+    :param header: header dict
+    :param data: buffer of the table
+    :param rows: buffer of the up-set and cover rows
+    :return: Pomonoid with words as elements, like the result of export()
+    """
+    words = header['words']
+    n = len(words)
+    code = header['typecode']
+    view = memoryview(data)
+    if header['byteorder'] == sys.byteorder:
+        data = view.cast(code)
+    else:
+        data = array(code, bytes(view))
+        data.byteswap()
+    table = CayleyTable.from_buffer(words, data)
+
+    result = Pomonoid(relations=set(map(tuple, header['relations'])),
+                      override_table=table,
+                      override_elements=set(words),
+                      is_export=True,
+                      base_relations=set(),
+                      base_generators=set(header['generators']))
+    result.operation.cayley_table = table
+    if 'generator_elements' in header:
+        result.operation.generator_elements = header['generator_elements']
+    result.normal_forms = words
+    result.relation_tracker = dict((k, set(v)) for k, v in
+                                   header['relation_tracker'].items())
+    if header['ordered']:
+        view = memoryview(rows)
+        width = n * ((n + 7) // 8)
+        up = bitsets.PackedRows(view[:width], n)
+        covers = bitsets.PackedRows(view[width:2 * width], n)
+        result.order = Order.from_rows(words, up, covers)
+    return result
+
+
+def save(monoid, path):
+    """
+    Write a Pomonoid or ProductPomonoid to path.
+
+    :param monoid: Pomonoid object with a complete table
+    :param path: file name
+    """
+    header, data, rows = encode(monoid)
+    header = json.dumps(header).encode('utf-8')
+    header += b' ' * (-(len(MAGIC) + 8 + len(header)) % 8)
+
+    tmp = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<II', VERSION, len(header)))
+        f.write(header)
+        f.write(data)
+        f.write(rows)
+    os.replace(tmp, path)
+
+
+def load(path):
+    """
+    Load a file written by save. The table and order rows are read straight
+    from a read-only memory map.
+
+    :param path: file name
+    :return: Pomonoid with words as elements, like the result of export()
+    """
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(buffer)
+    if bytes(view[:len(MAGIC)]) != MAGIC:
+        raise ValueError("%s is not a pomonoid file" % path)
+    offset = len(MAGIC) + 8
+    version, length = struct.unpack('<II', view[len(MAGIC):offset])
+    if version != VERSION:
+        raise ValueError("%s has format version %d, expected %d"
+                         % (path, version, VERSION))
+    header = json.loads(bytes(view[offset:offset + length]).decode('utf-8'))
+    offset += length
+
+    n = len(header['words'])
+    size = n * n * array(header['typecode']).itemsize
+    result = decode(header, view[offset:offset + size],
+                    view[offset + size:])
+    result._mmap = buffer
+    return result
+
+
+def cached_pomonoid(relations=set(), ordering=None,
+                    base_relations=BASE_RELATIONS,
+                    base_generators=BASE_GENERATORS,
+                    directory=None, **kwargs):
+    """
+    Return the pomonoid of a presentation from the cache directory, building
+    and saving it first if it is not there. Files are named by a hash of the
+    presentation and ordering, so an edited presentation never reads a stale
+    file.
+
+    :param relations, base_relations, base_generators: as for Pomonoid
+    :param ordering: optional order relations, as for attach_order
+    :param directory: cache directory, CACHE_DIR by default
+    :param kwargs: further arguments for Pomonoid
+    :return: Pomonoid loaded from the cache
+    """
+    directory = directory or CACHE_DIR
+    name = fingerprint(set(base_relations).union(relations), base_generators)
+    if ordering is not None:
+        text = repr(sorted(ordering)).encode('utf-8')
+        name += '-' + hashlib.sha1(text).hexdigest()[:16]
+    path = os.path.join(directory, name + '.pom')
+    if not os.path.exists(path):
+        monoid = Pomonoid(relations=relations,
+                          base_relations=base_relations,
+                          base_generators=base_generators,
+                          **kwargs)
+        if ordering is not None:
+            monoid.attach_order(ordering=ordering)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        save(monoid, path)
+    return load(path)
@@ -0,0 +1,226 @@
+"""
+Sweeps over families of presentations: a base presentation together with
+each of many candidate sets of extra relations, such as the variants of
+kura or ZDLRb in article_examples. Every candidate is built in a process
+pool under a time budget and a size budget, and comes back as a Summary of
+its size and invariants rather than as the model itself, so thousands of
+candidates can be screened without keeping them.
+
+Candidates whose presentations are identical are built once, and models
+whose canonical hashes agree (isomorphic ones) are reported as duplicates
+of the first of them.
+
+Usage:
+    candidates = (set(extra) for extra in itertools.combinations(pool, 2))
+    for summary in sweep(candidates, workers=8, timeout=10, max_size=500):
+        if summary.status == 'ok' and summary.duplicate_of is None:
+            print(summary)
+"""
+import signal
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import catalogue
+import isomorphism
+import storage
+from pomonoid import BASE_GENERATORS, BASE_RELATIONS, Pomonoid
+from rewriting import fingerprint
+
+# Tasks in flight per worker
+QUEUE_PER_WORKER = 4
+
+Summary = namedtuple('Summary', (
+    'index',         # position of the candidate in the sweep
+    'relations',     # sorted extra relations
+    'status',        # 'ok', 'too large', 'timeout' or 'error: ...'
+    'size',          # number of elements, or elements found before the
+                     # size or time budget ran out
+    'confluent',     # whether completion succeeded, so size is exact;
+                     # None if time ran out before it finished
+    'invariants',    # dict of catalogue.invariants, None unless 'ok'
+    'hash',          # isomorphism.canonical_hash, None unless 'ok'
+    'duplicate_of',  # index of an earlier isomorphic or equal candidate
+    'seconds',       # build time
+))
+
+# Per-process settings installed by the pool initializer
+_state = {}
+
+
+class Timeout(Exception):
+    pass
+
+
+def _alarm(signum, frame):
+    raise Timeout()
+
+
+def _init_sweep(base_relations, base_generators, ordering, max_size,
+                timeout):
+    _state.update(base_relations=base_relations,
+                  base_generators=base_generators,
+                  ordering=ordering,
+                  max_size=max_size,
+                  timeout=timeout)
+
+
+def build(relations, base_relations=BASE_RELATIONS,
+          base_generators=BASE_GENERATORS, ordering=None, max_size=None,
+          words=None):
+    """
+    Build a Pomonoid, enumerating at most max_size elements.
+
+    :param relations: extra relations
+    :param ordering: optional order relations between words, which are
+        reduced to normal forms first
+    :param words: optional list the elements are appended to as they are
+        found, so that they can be counted if the build is interrupted
+    :return: (Pomonoid, or None if it has more than max_size elements,
+        number of elements found, whether completion succeeded)
+    """
+    M = Pomonoid(relations=relations, base_relations=base_relations,
+                 base_generators=base_generators, lazy=True)
+    confluent = M.operation.rewriting_system.confluent
+    right_cayley = {}
+    if words is None:
+        words = []
+    for x in M.iter_elements(right_cayley=right_cayley):
+        words.append(x)
+        if max_size is not None and len(words) > max_size:
+            return None, len(words), confluent
+    M.normal_forms = words
+    M.right_cayley = right_cayley
+    M.elements = set(words)
+    M.operation._generate_table(words, right_cayley=right_cayley,
+                                backend='array')
+    if ordering is not None:
+        reduce = M.operation.reduce
+        M.attach_order(ordering=set((reduce(x) or '1', reduce(y) or '1')
+                                    for x, y in ordering))
+    return M, len(words), confluent
+
+
+def _run(task):
+    """
+    :param task: (index, sorted extra relations)
+    :return: Summary without duplicate_of
+    """
+    index, relations = task
+    timeout = _state['timeout']
+    start = time.perf_counter()
+    words = []
+    size = None
+    confluent = None
+    alarm = timeout and hasattr(signal, 'setitimer')
+    if alarm:
+        previous = signal.signal(signal.SIGALRM, _alarm)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        M, size, confluent = build(set(relations),
+                                   _state['base_relations'],
+                                   _state['base_generators'],
+                                   _state['ordering'],
+                                   _state['max_size'],
+                                   words)
+        if M is None:
+            status, values, digest = 'too large', None, None
+        else:
+            values = catalogue.invariants(*storage.encode(M))
+            digest = isomorphism.canonical_hash(M)
+            status = 'ok'
+    except Timeout:
+        status, values, digest = 'timeout', None, None
+        size = len(words)
+    except Exception as e:
+        status, values, digest = 'error: %r' % (e,), None, None
+    finally:
+        if alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+    return Summary(index, relations, status, size, confluent, values,
+                   digest, None, time.perf_counter() - start)
+
+
+def sweep(candidates, base_relations=BASE_RELATIONS,
+          base_generators=BASE_GENERATORS, ordering=None, workers=None,
+          timeout=None, max_size=None):
+    """
+    Build the Pomonoid of the base presentation with each candidate set of
+    extra relations added, yielding a Summary for each in candidate order
+    while later candidates are still being built.
+
+    :param candidates: iterable of sets of (word, word) relations, which
+        may be a generator; it is consumed as the workers become free
+    :param base_relations, base_generators: as for Pomonoid
+    :param ordering: optional order relations attached to every model
+    :param workers: number of processes, None to build in this process
+    :param timeout: seconds allowed per candidate, enforced with SIGALRM
+        where available
+    :param max_size: give up on candidates with more elements than this,
+        which is needed unless every candidate is known to be finite
+    :return: generator of Summary
+    """
+    settings = (base_relations, base_generators, ordering, max_size,
+                timeout)
+    seen = {}        # presentation fingerprint -> summary of the first
+    hashes = {}      # canonical hash -> index of the first model
+
+    def tasks():
+        for index, relations in enumerate(candidates):
+            relations = sorted(relations)
+            key = fingerprint(set(base_relations).union(relations),
+                              base_generators)
+            yield index, relations, key
+
+    def finish(summary):
+        if summary.hash is not None:
+            first = hashes.setdefault(summary.hash, summary.index)
+            if first != summary.index:
+                summary = summary._replace(duplicate_of=first)
+        return summary
+
+    def copy(index, relations, first):
+        if first.duplicate_of is not None:
+            return first._replace(index=index, relations=relations,
+                                  seconds=0.0)
+        return first._replace(index=index, relations=relations,
+                              duplicate_of=first.index, seconds=0.0)
+
+    if not workers:
+        _init_sweep(*settings)
+        for index, relations, key in tasks():
+            if key in seen:
+                yield copy(index, relations, seen[key])
+                continue
+            summary = seen[key] = finish(_run((index, relations)))
+            yield summary
+        return
+
+    pending = deque()
+    started = set()  # fingerprints of the candidates submitted
+    with ProcessPoolExecutor(workers, initializer=_init_sweep,
+                             initargs=settings) as pool:
+        todo = tasks()
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < QUEUE_PER_WORKER * workers:
+                try:
+                    index, relations, key = next(todo)
+                except StopIteration:
+                    exhausted = True
+                    break
+                if key in started:
+                    pending.append((index, relations, key, None))
+                else:
+                    started.add(key)
+                    pending.append((index, relations, key,
+                                    pool.submit(_run, (index, relations))))
+            if not pending:
+                return
+            index, relations, key, future = pending.popleft()
+            if future is None:
+                yield copy(index, relations, seen[key])
+            else:
+                summary = seen[key] = finish(future.result())
+                yield summary
@@ -0,0 +1,44 @@
+import unittest
+
+import article_examples
+from pomonoid import ProductPomonoid
+
+
+class TestImplicitProductOrder(unittest.TestCase):
+    """
+    The order queries of an implicit product agree with those of its export,
+    whose order is kept as rows of up-sets.
+    """
+    def setUp(self):
+        self.product = ProductPomonoid(article_examples.ZDLRb,
+                                       article_examples.ZDLRc,
+                                       article_examples.field)
+        self.export = self.product.export()
+
+    def test_sets(self):
+        order, word = self.product.order, self.product.word
+        for x in order._elements:
+            self.assertEqual(sorted(map(word, order.up_set(x))),
+                             sorted(self.export.order.up_set(word(x))))
+            self.assertEqual(sorted(map(word, order.down_set(x))),
+                             sorted(self.export.order.down_set(word(x))))
+
+    def test_intervals_joins_and_meets(self):
+        order, word = self.product.order, self.product.word
+
+        def name(x):
+            return None if x is None else word(x)
+
+        for x in order._elements:
+            for y in order._elements:
+                u, v = word(x), word(y)
+                self.assertEqual(sorted(map(word, order.interval(x, y))),
+                                 sorted(self.export.order.interval(u, v)))
+                self.assertEqual(name(order.join(x, y)),
+                                 self.export.order.join(u, v))
+                self.assertEqual(name(order.meet(x, y)),
+                                 self.export.order.meet(u, v))
+
+
+if __name__ == '__main__':
+    unittest.main()